@@ -0,0 +1,82 @@
+"""
+Valutazione vettoriale (NumPy) di molte posizioni alla volta, per l'analisi e la taratura offline.
+Ogni posizione è una riga di 64 interi (il codice del pezzo in ogni casa sq = r * 8 + c, 0 se vuota):
+materiale e punteggio posizionale si ottengono indicizzando le tabelle dei punteggi con l'intera matrice
+N x 64 e sommando per riga. Il risultato coincide esattamente con SmartMoveFinder.scoreBoard.
+"""
+
+import numpy
+from Chess.ScoreTables import CHECKMATE, STALEMATE, MATERIAL_SCORES, POSITION_SCORES
+
+PIECES = ('--', 'wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')  # Codice = indice
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+
+# Esito della partita nella posizione (scoreBoard lo controlla prima di materiale e posizione)
+NO_RESULT = 0
+WHITE_CHECKMATES = 1
+BLACK_CHECKMATES = 2
+STALEMATE_RESULT = 3
+CHUNK_SIZE = 16384  # Righe valutate insieme: i risultati intermedi di un blocco restano nella cache
+
+
+'''
+Tabelle dei punteggi indicizzate per codice, con il segno del colore: materiale (13 valori) e posizione
+(13 x 64 valori appiattiti, indice codice * 64 + casa)
+'''
+def scoreTables():
+    materialScores = numpy.zeros(len(PIECES), dtype=numpy.int16)
+    positionScores = numpy.zeros((len(PIECES), 64), dtype=numpy.int16)
+    for code, piece in enumerate(PIECES[1:], 1):
+        materialScores[code] = MATERIAL_SCORES[piece]
+        positionScores[code] = POSITION_SCORES[piece]
+    return materialScores, positionScores.ravel()
+
+
+'''
+Codifica le posizioni di gameStates: ritorna la matrice N x 64 dei codici dei pezzi e il vettore degli esiti
+'''
+def encodeGameStates(gameStates):
+    boards = numpy.zeros((len(gameStates), 64), dtype=numpy.int8)
+    results = numpy.zeros(len(gameStates), dtype=numpy.int8)
+    for i, gs in enumerate(gameStates):
+        row = boards[i]
+        board = gs.board
+        for squares in gs.pieceSquares.values():  # Solo le case occupate
+            for sq in squares:
+                row[sq] = PIECE_CODES[board[sq >> 3][sq & 7]]
+        if gs.checkMate:
+            results[i] = BLACK_CHECKMATES if gs.whiteToMove else WHITE_CHECKMATES
+        elif gs.staleMate:
+            results[i] = STALEMATE_RESULT
+    return boards, results
+
+
+'''
+Valuta N posizioni codificate (boards N x 64, results opzionale come in encodeGameStates).
+Ritorna un vettore float64 con gli stessi valori di scoreBoard: positivo se è in vantaggio il bianco.
+'''
+def scoreBoards(boards, results=None, tables=None):
+    materialScores, positionScores = tables if tables is not None else scoreTables()
+    boards = numpy.asarray(boards)
+    squares = numpy.arange(64, dtype=numpy.int16)
+    scores = numpy.empty(len(boards))
+    for start in range(0, len(boards), CHUNK_SIZE):
+        chunk = boards[start:start + CHUNK_SIZE].astype(numpy.int16)
+        materialScore = materialScores.take(chunk).sum(axis=1, dtype=numpy.int64)
+        positionScore = positionScores.take(chunk * 64 + squares).sum(axis=1, dtype=numpy.int64)
+        # Stesse operazioni di scoreBoard (intero + intero * .1 in doppia precisione), quindi stesso risultato
+        scores[start:start + CHUNK_SIZE] = materialScore + positionScore * .1
+    if results is not None:
+        results = numpy.asarray(results)
+        scores[results == WHITE_CHECKMATES] = CHECKMATE
+        scores[results == BLACK_CHECKMATES] = -CHECKMATE
+        scores[results == STALEMATE_RESULT] = STALEMATE
+    return scores
+
+
+'''
+Valuta una lista di GameState (codifica e valutazione in un solo passo)
+'''
+def scoreGameStates(gameStates, tables=None):
+    boards, results = encodeGameStates(gameStates)
+    return scoreBoards(boards, results, tables)
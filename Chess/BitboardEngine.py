@@ -0,0 +1,502 @@
+"""
+Rappresentazione alternativa del GameState basata su bitboard.
+Ogni pezzo di ogni colore è un intero a 64 bit: il bit r*8 + c vale 1 se il pezzo occupa la casa (r, c).
+La scacchiera 8x8 di stringhe viene comunque mantenuta, perché è usata dalla grafica e dalla valutazione;
+gli insiemi pieceSquares del GameState a matrice invece no: quando servono vengono ricavati dalle bitboard.
+"""
+
+from Chess import ChessEngine
+from Chess.ChessEngine import GameState, Move, EN_PASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG, PROMOTION_MOVE_FLAGS, \
+    ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT, CASTLING_RIGHTS_KEPT, \
+    UNDO_EN_PASSANT_SHIFT, UNDO_HALFMOVE_SHIFT, UNDO_HASH_SHIFT, EN_PASSANT_SQUARES
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))  # Sopra, sinistra, sotto, destra
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # Diagonali
+
+
+'''
+Bitboard delle case raggiungibili da (r, c) con gli spostamenti offsets
+'''
+def stepMask(r, c, offsets):
+    mask = 0
+    for dr, dc in offsets:
+        if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+            mask |= 1 << ((r + dr) * 8 + c + dc)
+    return mask
+
+
+'''
+Bitboard del raggio che parte da (r, c) (esclusa) nella direzione d, fino al bordo
+'''
+def rayMask(r, c, d):
+    mask = 0
+    r, c = r + d[0], c + d[1]
+    while 0 <= r < 8 and 0 <= c < 8:
+        mask |= 1 << (r * 8 + c)
+        r, c = r + d[0], c + d[1]
+    return mask
+
+
+KNIGHT_ATTACKS = [stepMask(sq // 8, sq % 8, KNIGHT_OFFSETS) for sq in range(64)]
+KING_ATTACKS = [stepMask(sq // 8, sq % 8, KING_OFFSETS) for sq in range(64)]
+# Case attaccate da un pedone del colore indicato (il bianco avanza verso la riga 0)
+PAWN_ATTACKS = {'w': [stepMask(sq // 8, sq % 8, ((-1, -1), (-1, 1))) for sq in range(64)],
+                'b': [stepMask(sq // 8, sq % 8, ((1, -1), (1, 1))) for sq in range(64)]}
+RAYS = {d: [rayMask(sq // 8, sq % 8, d) for sq in range(64)] for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# Case strettamente comprese tra due case allineate (0 se non sono sulla stessa riga, colonna o diagonale)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _d in RAYS:
+        _between = 0
+        _r, _c = _sq // 8 + _d[0], _sq % 8 + _d[1]
+        while 0 <= _r < 8 and 0 <= _c < 8:
+            BETWEEN[_sq][_r * 8 + _c] = _between
+            _between |= 1 << (_r * 8 + _c)
+            _r, _c = _r + _d[0], _c + _d[1]
+ALL_SQUARES = (1 << 64) - 1
+# Nei raggi "positivi" l'indice delle case cresce, quindi il primo ostacolo è il bit meno significativo
+POSITIVE_RAY = {d: d[0] * 8 + d[1] > 0 for d in RAYS}
+
+
+'''
+Attacchi di un pezzo che scorre lungo le direzioni date, fermandosi al primo ostacolo (incluso)
+'''
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_RAY[d]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+'''
+Insieme delle case (r * 8 + c) dei bit a 1 della bitboard
+'''
+def squaresOf(bitboard):
+    squares = set()
+    while bitboard:
+        bit = bitboard & -bitboard
+        squares.add(bit.bit_length() - 1)
+        bitboard ^= bit
+    return squares
+
+
+class BitboardGameState(GameState):
+    checkMask = ALL_SQUARES  # Case in cui un pezzo (non il re) può andare per parare uno scacco
+    pinMasks = {}  # Pezzi inchiodati: casa -> case lungo la linea dell'inchiodatura
+
+    '''
+    Al posto degli insiemi pieceSquares del GameState a matrice vengono costruite le bitboard
+    (chiamato da __init__ e da loadFen)
+    '''
+    def loadPieceSquares(self):
+        self.loadBitboards()
+
+    '''
+    Ricostruisce le bitboard a partire dalla scacchiera
+    '''
+    def loadBitboards(self):
+        self.pieceBitboards = {color + piece: 0 for color in 'wb' for piece in 'pRNBQK'}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                square = self.board[r][c]
+                if square != '--':
+                    bit = 1 << (r * 8 + c)
+                    self.pieceBitboards[square] |= bit
+                    self.colorBitboards[square[0]] |= bit
+        self.occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+
+    '''
+    Case occupate dai pezzi di ogni colore, ricavate dalle bitboard (makeMove non mantiene gli insiemi)
+    '''
+    @property
+    def pieceSquares(self):
+        return {color: squaresOf(self.colorBitboards[color]) for color in 'wb'}
+
+    def pieceCount(self):
+        return self.occupied.bit_count()
+
+    '''
+    Esegue la mossa in un solo passaggio su scacchiera, bitboard, hash, punteggi e stato da ripristinare
+    (stessi effetti di GameState.makeMove, senza aggiornare gli insiemi pieceSquares)
+    '''
+    def makeMove(self, move):
+        moveID = move.moveID
+        start, end = moveID & 63, (moveID >> 6) & 63
+        pieceMoved, pieceCaptured = move.pieceMoved, move.pieceCaptured
+        ally = pieceMoved[0]
+        board, pieces, colors = self.board, self.pieceBitboards, self.colorBitboards
+        zobristHash = self.zobristHash ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_PIECES[pieceMoved][start]
+        if self.enPassantPossible != ():
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+            enPassantSquare = self.enPassantPossible[0] * 8 + self.enPassantPossible[1] + 1
+        else:
+            enPassantSquare = 0
+        # Salva lo stato che la mossa non permette di ricostruire
+        self.undoStack.append(self.castlingRights | enPassantSquare << UNDO_EN_PASSANT_SHIFT
+                              | self.halfmoveClock << UNDO_HALFMOVE_SHIFT | self.zobristHash << UNDO_HASH_SHIFT)
+        if pieceMoved[1] == 'p' or pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.moveLog.append(move)
+        self.whiteToMove = not self.whiteToMove
+        materialDelta, positionDelta = self.moveScoreDelta(move)
+        self.materialScore += materialDelta
+        self.positionScore += positionDelta
+
+        fromBit, toBit = 1 << start, 1 << end
+        if moveID & PROMOTION_FLAG:
+            pieceLanded = move.promotionPiece
+            pieces[pieceMoved] ^= fromBit
+            pieces[pieceLanded] ^= toBit
+        else:
+            pieceLanded = pieceMoved
+            pieces[pieceMoved] ^= fromBit | toBit
+            if pieceMoved[1] == 'K':
+                if ally == 'w':
+                    self.whiteKingLocation = (end >> 3, end & 7)
+                else:
+                    self.blackKingLocation = (end >> 3, end & 7)
+        colors[ally] ^= fromBit | toBit
+        board[start >> 3][start & 7] = '--'
+        board[end >> 3][end & 7] = pieceLanded
+        zobristHash ^= ZOBRIST_PIECES[pieceLanded][end]
+
+        if pieceCaptured != '--':
+            if moveID & EN_PASSANT_FLAG:  # Il pedone catturato è accanto alla casa di partenza
+                captureSquare = (start & 0o70) | (end & 7)
+                board[start >> 3][end & 7] = '--'
+            else:
+                captureSquare = end
+            pieces[pieceCaptured] ^= 1 << captureSquare
+            colors[pieceCaptured[0]] ^= 1 << captureSquare
+            zobristHash ^= ZOBRIST_PIECES[pieceCaptured][captureSquare]
+
+        if pieceMoved[1] == 'p' and (end - start == 16 or start - end == 16):  # Il pedone avanza di due case
+            self.enPassantPossible = ((start + end) >> 4, start & 7)
+            zobristHash ^= ZOBRIST_EN_PASSANT[start & 7]
+        else:
+            self.enPassantPossible = ()
+
+        if moveID & CASTLE_FLAG:
+            rookFrom, rookTo = (end + 1, end - 1) if end > start else (end - 2, end + 1)  # Corto / lungo
+            rook = ally + 'R'
+            board[end >> 3][rookTo & 7] = rook
+            board[end >> 3][rookFrom & 7] = '--'
+            pieces[rook] ^= (1 << rookFrom) | (1 << rookTo)
+            colors[ally] ^= (1 << rookFrom) | (1 << rookTo)
+            zobristHash ^= ZOBRIST_PIECES[rook][rookFrom] ^ ZOBRIST_PIECES[rook][rookTo]
+        self.occupied = colors['w'] | colors['b']
+
+        castlingRights = self.castlingRights & CASTLING_RIGHTS_KEPT[start] & CASTLING_RIGHTS_KEPT[end]
+        zobristHash ^= ZOBRIST_CASTLING[self.castlingRights] ^ ZOBRIST_CASTLING[castlingRights]
+        self.castlingRights = castlingRights
+        self.zobristHash = zobristHash
+        if ChessEngine.ZOBRIST_DEBUG:
+            assert zobristHash == self.computeZobristHash(), 'Hash di Zobrist incrementale errato'
+
+    '''
+    Annulla la mossa precedente (l'inverso di makeMove)
+    '''
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog.pop()
+            moveID = move.moveID
+            start, end = moveID & 63, (moveID >> 6) & 63
+            pieceMoved, pieceCaptured = move.pieceMoved, move.pieceCaptured
+            ally = pieceMoved[0]
+            board, pieces, colors = self.board, self.pieceBitboards, self.colorBitboards
+            self.whiteToMove = not self.whiteToMove
+            materialDelta, positionDelta = self.moveScoreDelta(move)
+            self.materialScore -= materialDelta
+            self.positionScore -= positionDelta
+
+            fromBit, toBit = 1 << start, 1 << end
+            if moveID & PROMOTION_FLAG:
+                pieces[pieceMoved] ^= fromBit
+                pieces[move.promotionPiece] ^= toBit
+            else:
+                pieces[pieceMoved] ^= fromBit | toBit
+                if pieceMoved[1] == 'K':
+                    if ally == 'w':
+                        self.whiteKingLocation = (start >> 3, start & 7)
+                    else:
+                        self.blackKingLocation = (start >> 3, start & 7)
+            colors[ally] ^= fromBit | toBit
+            board[start >> 3][start & 7] = pieceMoved
+            if moveID & EN_PASSANT_FLAG:
+                captureSquare = (start & 0o70) | (end & 7)
+                board[end >> 3][end & 7] = '--'
+                board[start >> 3][end & 7] = pieceCaptured
+            else:
+                captureSquare = end
+                board[end >> 3][end & 7] = pieceCaptured
+            if pieceCaptured != '--':
+                pieces[pieceCaptured] ^= 1 << captureSquare
+                colors[pieceCaptured[0]] ^= 1 << captureSquare
+
+            if moveID & CASTLE_FLAG:
+                rookFrom, rookTo = (end + 1, end - 1) if end > start else (end - 2, end + 1)
+                rook = ally + 'R'
+                board[end >> 3][rookFrom & 7] = rook
+                board[end >> 3][rookTo & 7] = '--'
+                pieces[rook] ^= (1 << rookFrom) | (1 << rookTo)
+                colors[ally] ^= (1 << rookFrom) | (1 << rookTo)
+            self.occupied = colors['w'] | colors['b']
+
+            # Ripristina en passant, diritto ad arrocco, contatore delle semimosse e hash
+            state = self.undoStack.pop()
+            self.castlingRights = state & 15
+            self.enPassantPossible = EN_PASSANT_SQUARES[(state >> UNDO_EN_PASSANT_SHIFT) & 127]
+            self.halfmoveClock = (state >> UNDO_HALFMOVE_SHIFT) & 0xFFF
+            self.zobristHash = state >> UNDO_HASH_SHIFT
+            if ChessEngine.ZOBRIST_DEBUG:
+                assert self.zobristHash == self.computeZobristHash(), 'Hash di Zobrist incrementale errato'
+            self.checkMate = False
+            self.staleMate = False
+
+    '''
+    Bitboard dei pezzi del colore color che attaccano la casa sq
+    '''
+    def attackersTo(self, sq, color, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieceBitboards
+        enemy = 'b' if color == 'w' else 'w'
+        return ((PAWN_ATTACKS[enemy][sq] & pieces[color + 'p'])  # Un pedone attacca sq se sq attacca lui "al contrario"
+                | (KNIGHT_ATTACKS[sq] & pieces[color + 'N'])
+                | (KING_ATTACKS[sq] & pieces[color + 'K'])
+                | (bishopAttacks(sq, occupied) & (pieces[color + 'B'] | pieces[color + 'Q']))
+                | (rookAttacks(sq, occupied) & (pieces[color + 'R'] | pieces[color + 'Q'])))
+
+    '''
+    Verifica se il nemico attacca la casa r, c
+    '''
+    def squareUnderAttack(self, r, c):
+        return self.attackersTo(r * 8 + c, 'b' if self.whiteToMove else 'w') != 0
+
+    '''
+    Insieme delle coordinate dei pezzi nemici che attaccano la casa r, c
+    '''
+    def attackersOfSquare(self, r, c, firstOnly=False):
+        attackers = self.attackersTo(r * 8 + c, 'b' if self.whiteToMove else 'w')
+        if firstOnly:
+            attackers &= -attackers
+        squares = set()
+        while attackers:
+            bit = attackers & -attackers
+            sq = bit.bit_length() - 1
+            squares.add((sq >> 3, sq & 7))
+            attackers ^= bit
+        return squares
+
+    '''
+    Pezzi che danno scacco e pezzi inchiodati come bitboard: ritorna (sottoScacco, maschere delle inchiodature,
+    case in cui un pezzo può parare lo scacco), da passare a generateLegalMoves
+    '''
+    def checkForPinsAndChecks(self):
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSq = self.pieceBitboards[ally + 'K'].bit_length() - 1
+        checkers = self.attackersTo(kingSq, enemy)
+        if checkers == 0:
+            checkMask = ALL_SQUARES
+        elif checkers & (checkers - 1) == 0:  # Scacco singolo: cattura o blocca
+            checkMask = checkers | BETWEEN[kingSq][checkers.bit_length() - 1]
+        else:  # Scacco doppio: si può solo muovere il re
+            checkMask = 0
+        return checkers != 0, self.getPinMasks(kingSq, ally, enemy), checkMask
+
+    '''
+    Genera le mosse legali (di tutti i pezzi o solo di quello in square) e ritorna (mosse, sottoScacco).
+    Pezzi che danno scacco e pezzi inchiodati vengono calcolati una volta sola come bitboard
+    (oppure ricevuti in pinsAndChecks), e ogni generatore interseca le proprie destinazioni con quelle maschere.
+    '''
+    def generateLegalMoves(self, square=None, pinsAndChecks=None):
+        ally = 'w' if self.whiteToMove else 'b'
+        kingSq = self.pieceBitboards[ally + 'K'].bit_length() - 1
+        kingRow, kingCol = kingSq >> 3, kingSq & 7
+        inCheck, self.pinMasks, self.checkMask = pinsAndChecks if pinsAndChecks is not None \
+            else self.checkForPinsAndChecks()
+
+        moves = []
+        if square is None:
+            if self.checkMask:
+                self.getPieceMoves(ally, 'pRNBQ', moves)
+        elif square != (kingRow, kingCol):  # Solo il pezzo in square
+            piece = self.board[square[0]][square[1]]
+            if piece[0] == ally and self.checkMask:
+                self.moveFunctions[piece[1]](square[0], square[1], moves)
+        if square is None or square == (kingRow, kingCol):
+            self.getKingMoves(kingRow, kingCol, moves)
+            if not inCheck and not self.capturesOnly:
+                self.getCastleMoves(kingRow, kingCol, moves)
+        self.checkMask = ALL_SQUARES
+        self.pinMasks = {}
+        return moves, inCheck
+
+    '''
+    Per ogni pezzo amico inchiodato al re, la bitboard delle case in cui può muoversi
+    (le case tra il re e il pezzo nemico, più il pezzo nemico stesso)
+    '''
+    def getPinMasks(self, kingSq, ally, enemy):
+        pinMasks = {}
+        pieces = self.pieceBitboards
+        snipers = ((rookAttacks(kingSq, 0) & (pieces[enemy + 'R'] | pieces[enemy + 'Q']))
+                   | (bishopAttacks(kingSq, 0) & (pieces[enemy + 'B'] | pieces[enemy + 'Q'])))
+        while snipers:
+            sniper = snipers & -snipers
+            sniperSq = sniper.bit_length() - 1
+            between = BETWEEN[kingSq][sniperSq]
+            blockers = between & self.occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & self.colorBitboards[ally]:
+                pinMasks[blockers.bit_length() - 1] = between | sniper
+            snipers ^= sniper
+        return pinMasks
+
+    '''
+    Mosse senza scacco: scorre solo i pezzi del giocatore di turno
+    '''
+    def getAllPossibleMoves(self):
+        moves = []
+        ally = 'w' if self.whiteToMove else 'b'
+        self.getPieceMoves(ally, 'pRNBQK', moves)
+        return moves
+
+    def getPieceMoves(self, ally, pieceTypes, moves):
+        for piece in pieceTypes:
+            pieces = self.pieceBitboards[ally + piece]
+            while pieces:
+                bit = pieces & -pieces
+                sq = bit.bit_length() - 1
+                self.moveFunctions[piece](sq >> 3, sq & 7, moves)
+                pieces ^= bit
+
+    '''
+    Case in cui i pezzi del giocatore di turno possono arrivare: quelle non occupate da pezzi amici,
+    oppure solo quelle occupate da pezzi nemici se si generano solo catture (solo quelle vuote per le mosse tranquille)
+    '''
+    def moveTargets(self):
+        if self.capturesOnly:
+            return self.colorBitboards['b' if self.whiteToMove else 'w']
+        if self.quietOnly:
+            return ~self.occupied
+        return ~self.colorBitboards['w' if self.whiteToMove else 'b']
+
+    '''
+    Aggiunge una mossa da (r, c) verso ogni casa della bitboard targets che para un eventuale scacco
+    e che rispetta un'eventuale inchiodatura
+    '''
+    def addMoves(self, r, c, targets, moves, flags=0):
+        start = r * 8 + c
+        targets &= self.checkMask & self.pinMasks.get(start, ALL_SQUARES)
+        piece = self.board[r][c]
+        while targets:
+            bit = targets & -targets
+            sq = bit.bit_length() - 1
+            moves.append(Move.fromID(start | sq << 6 | flags, piece, self.board[sq >> 3][sq & 7]))
+            targets ^= bit
+
+    def getPawnMoves(self, r, c, moves):
+        sq = r * 8 + c
+        if self.whiteToMove:
+            ally, enemy, step, startRow, lastRow = 'w', 'b', -8, 6, 1
+        else:
+            ally, enemy, step, startRow, lastRow = 'b', 'w', 8, 1, 6
+        pushes = 0
+        if not self.occupied & (1 << (sq + step)):  # Se la cella avanti è vuota
+            pushes = 1 << (sq + step)
+            if r == startRow and not self.occupied & (1 << (sq + 2 * step)):  # Se la seconda cella avanti è vuota
+                pushes |= 1 << (sq + 2 * step)
+        attacks = PAWN_ATTACKS[ally][sq]
+        captures = attacks & self.colorBitboards[enemy]
+        if r == lastRow:  # Promozione: una mossa per pezzo (solo Regina se servono le catture)
+            if self.capturesOnly:
+                promotions = PROMOTION_MOVE_FLAGS[:1]
+            elif self.quietOnly:  # Le sottopromozioni sono nelle mosse tranquille
+                promotions = PROMOTION_MOVE_FLAGS[1:]
+            else:
+                promotions = PROMOTION_MOVE_FLAGS
+            for flags in promotions:
+                self.addMoves(r, c, pushes | captures, moves, flags)
+        else:
+            if self.capturesOnly:  # Gli avanzamenti sono mosse tranquille
+                pushes = 0
+            elif self.quietOnly:
+                captures = 0
+            self.addMoves(r, c, pushes | captures, moves)
+        if self.enPassantPossible != () and not self.quietOnly:
+            epRow, epCol = self.enPassantPossible
+            if attacks & (1 << (epRow * 8 + epCol)) and self.enPassantSafe(r, c, epRow, epCol):
+                moves.append(Move.fromID(sq | (epRow * 8 + epCol) << 6 | EN_PASSANT_FLAG, ally + 'p', enemy + 'p'))
+
+    '''
+    L'en passant toglie dalla scacchiera due pedoni in un colpo solo: si verifica direttamente
+    che, dopo la cattura, il re non sia attaccato (copre scacchi parati e scacchi di scoperta)
+    '''
+    def enPassantSafe(self, r, c, epRow, epCol):
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        capturedBit = 1 << (r * 8 + epCol)
+        occupied = (self.occupied ^ (1 << (r * 8 + c)) ^ capturedBit) | (1 << (epRow * 8 + epCol))
+        kingSq = self.pieceBitboards[ally + 'K'].bit_length() - 1
+        return self.attackersTo(kingSq, enemy, occupied) & ~capturedBit == 0
+
+    def getRookMoves(self, r, c, moves):
+        self.addMoves(r, c, rookAttacks(r * 8 + c, self.occupied) & self.moveTargets(), moves)
+
+    def getKnightMoves(self, r, c, moves):
+        self.addMoves(r, c, KNIGHT_ATTACKS[r * 8 + c] & self.moveTargets(), moves)
+
+    def getBishopMoves(self, r, c, moves):
+        self.addMoves(r, c, bishopAttacks(r * 8 + c, self.occupied) & self.moveTargets(), moves)
+
+    def getQueenMoves(self, r, c, moves):
+        sq = r * 8 + c
+        targets = rookAttacks(sq, self.occupied) | bishopAttacks(sq, self.occupied)
+        self.addMoves(r, c, targets & self.moveTargets(), moves)
+
+    '''
+    Genera le mosse del re (solo verso case non attaccate).
+    Il re viene tolto dall'occupazione, così non fa da schermo agli attacchi lungo la linea dello scacco.
+    '''
+    def getKingMoves(self, r, c, moves):
+        ally, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        start = r * 8 + c
+        occupied = self.occupied ^ (1 << start)
+        targets = KING_ATTACKS[start] & self.moveTargets()
+        while targets:
+            bit = targets & -targets
+            sq = bit.bit_length() - 1
+            if not self.attackersTo(sq, enemy, occupied):
+                moves.append(Move.fromID(start | sq << 6, ally + 'K', self.board[sq >> 3][sq & 7]))
+            targets ^= bit
+
+    def getKingSideCastleMoves(self, r, c, moves):
+        sq = r * 8 + c
+        if not self.occupied & ((1 << (sq + 1)) | (1 << (sq + 2))):
+            if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
+                moves.append(Move.fromID(sq | (sq + 2) << 6 | CASTLE_FLAG, self.board[r][c], '--'))
+
+    def getQueenSideCastleMoves(self, r, c, moves):
+        sq = r * 8 + c
+        if not self.occupied & ((1 << (sq - 1)) | (1 << (sq - 2)) | (1 << (sq - 3))):
+            if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
+                moves.append(Move.fromID(sq | (sq - 2) << 6 | CASTLE_FLAG, self.board[r][c], '--'))
@@ -4,10 +4,68 @@ Inoltre, verifica quali sono le mosse valide nello stato corrente e tiene tracci
 delle mosse compiute.
 """
 
+import random
 import pygame as p
+from Chess.ScoreTables import MATERIAL_SCORES, POSITION_SCORES
+
+# Codifica di una mossa in un intero (Move.moveID):
+# bit 0-5 casa di partenza, bit 6-11 casa di arrivo (ogni casa è riga * 8 + colonna),
+# bit 12-14 flag della mossa, bit 15-16 pezzo scelto per la promozione (indice in PROMOTION_PIECES)
+EN_PASSANT_FLAG = 1 << 12
+CASTLE_FLAG = 1 << 13
+PROMOTION_FLAG = 1 << 14
+PROMOTION_SHIFT = 15
+PROMOTION_PIECES = 'QRBN'
+MOVE_KEY_MASK = 0xFFF | (3 << PROMOTION_SHIFT)  # Parte che identifica la mossa (usata da __eq__)
+# Flag di una promozione per ciascun pezzo di PROMOTION_PIECES (il primo è la Regina)
+PROMOTION_MOVE_FLAGS = tuple(PROMOTION_FLAG | i << PROMOTION_SHIFT for i in range(len(PROMOTION_PIECES)))
+
+# Chiavi di Zobrist: l'hash di una posizione è lo XOR delle chiavi di pezzi e case occupate, del turno,
+# dei diritti ad arrocco e della colonna dell'en passant. Il seme fisso rende l'hash stabile tra esecuzioni.
+_zobristRandom = random.Random(20220318)
+ZOBRIST_PIECES = {color + piece: [_zobristRandom.getrandbits(64) for _ in range(64)]
+                  for color in 'wb' for piece in 'pRNBQK'}
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(16)]  # Indicizzate con la maschera degli arrocchi
+ZOBRIST_EN_PASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]  # Una per colonna
+# Diritti ad arrocco come maschera di 4 bit
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+# Diritti che restano dopo una mossa che parte da o arriva in una casa: le case iniziali di re e torri
+# (torre mossa o catturata) tolgono i diritti corrispondenti
+CASTLING_RIGHTS_KEPT = [15] * 64
+CASTLING_RIGHTS_KEPT[60] = 15 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)  # Re bianco
+CASTLING_RIGHTS_KEPT[4] = 15 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)  # Re nero
+CASTLING_RIGHTS_KEPT[56] = 15 & ~WHITE_QUEEN_SIDE  # Torre sinistra del bianco
+CASTLING_RIGHTS_KEPT[63] = 15 & ~WHITE_KING_SIDE  # Torre destra del bianco
+CASTLING_RIGHTS_KEPT[0] = 15 & ~BLACK_QUEEN_SIDE  # Torre sinistra del nero
+CASTLING_RIGHTS_KEPT[7] = 15 & ~BLACK_KING_SIDE  # Torre destra del nero
+
+# Ogni voce di undoStack è un intero che contiene lo stato irreversibile di prima della mossa:
+# bit 0-3 diritti ad arrocco, bit 4-10 casa en passant + 1 (0 se assente),
+# bit 11-22 contatore delle semimosse, dal bit 23 l'hash di Zobrist
+UNDO_EN_PASSANT_SHIFT = 4
+UNDO_HALFMOVE_SHIFT = 11
+UNDO_HASH_SHIFT = 23
+# enPassantPossible corrispondente al campo en passant di una voce (tuple già pronte, niente allocazioni)
+EN_PASSANT_SQUARES = [()] + [(sq // 8, sq % 8) for sq in range(64)]
+
+ZOBRIST_DEBUG = False  # Se True, ogni makeMove/undoMove confronta l'hash incrementale con quello ricalcolato
+
 
 class GameState():
-    def __init__(self):
+    '''
+    Con useBitboards=True viene creato un BitboardGameState, che espone la stessa interfaccia
+    '''
+    def __new__(cls, useBitboards=False):
+        if useBitboards and cls is GameState:
+            from Chess.BitboardEngine import BitboardGameState
+            cls = BitboardGameState
+        return super().__new__(cls)
+
+    def __init__(self, useBitboards=False):
         # La scacchiera è una lista 2d 8x8, ogni elemento della lista ha 2 caratteri.
         # Il primo carattere rappresenta il colore, il secondo la sigla del pezzo.
         # "--" rappresenta una casella vuota.
@@ -32,51 +90,245 @@ class GameState():
         self.checkMate = False
         self.staleMate = False
         self.enPassantPossible = ()  # Coordinate della cella disponibile per en passant
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                             self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        self.pins = {}  # Pezzi inchiodati del giocatore di turno: casa -> direzione dal re
+        self.checks = []  # Pezzi che danno scacco al re del giocatore di turno
+        self.capturesOnly = False  # Se True i generatori producono solo catture e promozioni a Regina
+        self.quietOnly = False  # Se True i generatori producono solo le altre mosse (tranquille e sottopromozioni)
+        self.castlingRights = WHITE_KING_SIDE | WHITE_QUEEN_SIDE | BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+        self.halfmoveClock = 0  # Semimosse dall'ultima cattura o mossa di pedone (regola delle 50 mosse)
+        self.startPly = 0  # Semimosse giocate prima della posizione iniziale (da loadFen), per il numero di mossa
+        self.zobristHash = self.computeZobristHash()  # Hash di Zobrist a 64 bit, aggiornato in modo incrementale
+        self.undoStack = []  # Stato irreversibile di prima di ogni mossa di moveLog, impacchettato in un intero
+        self.loadPieceSquares()
+        # Materiale e punteggio posizionale (bianco - nero), aggiornati da makeMove e undoMove
+        self.materialScore, self.positionScore = self.computeScores()
+
+    '''
+    Carica una posizione in notazione FEN (scacchiera, turno, arrocchi, en passant) e azzera la storia della partita
+    '''
+    def loadFen(self, fen):
+        fields = fen.split()
+        for r, rank in enumerate(fields[0].split('/')):
+            c = 0
+            for char in rank:
+                if char.isdigit():
+                    for _ in range(int(char)):
+                        self.board[r][c] = '--'
+                        c += 1
+                else:
+                    color = 'w' if char.isupper() else 'b'
+                    piece = 'p' if char in 'Pp' else char.upper()
+                    self.board[r][c] = color + piece
+                    if piece == 'K':
+                        if color == 'w':
+                            self.whiteKingLocation = (r, c)
+                        else:
+                            self.blackKingLocation = (r, c)
+                    c += 1
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.castlingRights = 0
+        for char, right in (('K', WHITE_KING_SIDE), ('Q', WHITE_QUEEN_SIDE),
+                            ('k', BLACK_KING_SIDE), ('q', BLACK_QUEEN_SIDE)):
+            if char in castling:
+                self.castlingRights |= right
+        enPassant = fields[3] if len(fields) > 3 else '-'
+        if enPassant != '-':
+            self.enPassantPossible = (Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]])
+        else:
+            self.enPassantPossible = ()
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.startPly = 2 * (int(fields[5]) - 1) + (not self.whiteToMove) if len(fields) > 5 else 0
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristHash = self.computeZobristHash()
+        self.undoStack = []
+        self.loadPieceSquares()
+        self.materialScore, self.positionScore = self.computeScores()
 
+    '''
+    Ritorna la posizione corrente in notazione FEN
+    '''
+    def getFen(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for square in row:
+                if square == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                piece = 'P' if square[1] == 'p' else square[1]
+                rank += piece if square[0] == 'w' else piece.lower()
+            ranks.append(rank + (str(empty) if empty else ''))
+        castling = ''.join(char for char, right in (('K', WHITE_KING_SIDE), ('Q', WHITE_QUEEN_SIDE),
+                                                    ('k', BLACK_KING_SIDE), ('q', BLACK_QUEEN_SIDE))
+                           if self.castlingRights & right)
+        if self.enPassantPossible != ():
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        else:
+            enPassant = '-'
+        fullmoveNumber = 1 + (self.startPly + len(self.moveLog)) // 2
+        return ' '.join(('/'.join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enPassant,
+                         str(self.halfmoveClock), str(fullmoveNumber)))
+
+    '''
+    Ricalcola da zero l'hash di Zobrist della posizione corrente (per il debug dell'hash incrementale)
+    '''
+    def computeZobristHash(self):
+        zobristHash = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != '--':
+                    zobristHash ^= ZOBRIST_PIECES[self.board[r][c]][r * 8 + c]
+        if not self.whiteToMove:
+            zobristHash ^= ZOBRIST_BLACK_TO_MOVE
+        zobristHash ^= ZOBRIST_CASTLING[self.castlingRights]
+        if self.enPassantPossible != ():
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        return zobristHash
+
+
+    '''
+    Ricalcola da zero materiale e punteggio posizionale della scacchiera
+    '''
+    def computeScores(self):
+        materialScore = positionScore = 0
+        for squares in self.pieceSquares.values():
+            for sq in squares:
+                piece = self.board[sq >> 3][sq & 7]
+                materialScore += MATERIAL_SCORES[piece]
+                positionScore += POSITION_SCORES[piece][sq]
+        return materialScore, positionScore
+
+    '''
+    Ricostruisce dalla scacchiera gli insiemi delle case occupate dai pezzi di ogni colore
+    '''
+    def loadPieceSquares(self):
+        self.pieceSquares = {'w': set(), 'b': set()}  # Case (r * 8 + c) occupate dai pezzi di ogni colore
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != '--':
+                    self.pieceSquares[self.board[r][c][0]].add(r * 8 + c)
+
+    '''
+    Numero di pezzi sulla scacchiera, re compresi
+    '''
+    def pieceCount(self):
+        return len(self.pieceSquares['w']) + len(self.pieceSquares['b'])
+
+    '''
+    Variazione di materiale e punteggio posizionale causata dalla mossa (catture, promozioni, arrocco compresi)
+    '''
+    def moveScoreDelta(self, move):
+        moveID = move.moveID
+        start, end = moveID & 63, (moveID >> 6) & 63
+        materialDelta = 0
+        positionDelta = -POSITION_SCORES[move.pieceMoved][start]
+        if moveID & PROMOTION_FLAG:
+            promotionPiece = move.promotionPiece
+            materialDelta += MATERIAL_SCORES[promotionPiece] - MATERIAL_SCORES[move.pieceMoved]
+            positionDelta += POSITION_SCORES[promotionPiece][end]
+        else:
+            positionDelta += POSITION_SCORES[move.pieceMoved][end]
+        if move.pieceCaptured != '--':
+            captureSquare = (start & 0o70) | (end & 7) if moveID & EN_PASSANT_FLAG else end
+            materialDelta -= MATERIAL_SCORES[move.pieceCaptured]
+            positionDelta -= POSITION_SCORES[move.pieceCaptured][captureSquare]
+        if moveID & CASTLE_FLAG:
+            rook = POSITION_SCORES[move.pieceMoved[0] + 'R']
+            if end > start:  # Arrocco corto
+                positionDelta += rook[end - 1] - rook[end + 1]
+            else:  # Arrocco lungo
+                positionDelta += rook[end + 1] - rook[end - 2]
+        return materialDelta, positionDelta
 
     '''
     Esamina una mossa e la esegue 
     '''
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        moveID = move.moveID
+        startRow, startCol = (moveID >> 3) & 7, moveID & 7  # Decodifica una sola volta le case della mossa
+        endRow, endCol = (moveID >> 9) & 7, (moveID >> 6) & 7
+        start, end = moveID & 63, (moveID >> 6) & 63
+        zobristHash = self.zobristHash ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_PIECES[move.pieceMoved][start]
+        if self.enPassantPossible != ():
+            zobristHash ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+            enPassantSquare = self.enPassantPossible[0] * 8 + self.enPassantPossible[1] + 1
+        else:
+            enPassantSquare = 0
+        # Salva lo stato che la mossa non permette di ricostruire
+        self.undoStack.append(self.castlingRights | enPassantSquare << UNDO_EN_PASSANT_SHIFT
+                              | self.halfmoveClock << UNDO_HALFMOVE_SHIFT | self.zobristHash << UNDO_HASH_SHIFT)
+        if move.pieceMoved[1] == 'p' or move.pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+
+        self.board[startRow][startCol] = "--"
+        self.board[endRow][endCol] = move.pieceMoved
+        allySquares = self.pieceSquares[move.pieceMoved[0]]
+        allySquares.remove(start)
+        allySquares.add(end)
         self.moveLog.append(move)  # Registra la mossa
         self.whiteToMove = not self.whiteToMove
+        materialDelta, positionDelta = self.moveScoreDelta(move)
+        self.materialScore += materialDelta
+        self.positionScore += positionDelta
         # Aggiorna la posizione del re, se necessario
         if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
+            self.whiteKingLocation = (endRow, endCol)
         if move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+            self.blackKingLocation = (endRow, endCol)
 
-        # Promozione pedone a Regina
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+        # Promozione pedone
+        if moveID & PROMOTION_FLAG:
+            self.board[endRow][endCol] = move.promotionPiece
 
-        # EnPassant
-        if move.isEnPassantMove:
-            self.board[move.startRow][move.endCol] = '--'
+        zobristHash ^= ZOBRIST_PIECES[self.board[endRow][endCol]][end]
 
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:  # Solo se il pedone avanza di due case
-            self.enPassantPossible = ((move.startRow + move.endRow)//2, move.startCol)
+        # EnPassant
+        if moveID & EN_PASSANT_FLAG:
+            self.board[startRow][endCol] = '--'
+            zobristHash ^= ZOBRIST_PIECES[move.pieceCaptured][startRow * 8 + endCol]
+            self.pieceSquares[move.pieceCaptured[0]].remove(startRow * 8 + endCol)
+        elif move.pieceCaptured != '--':
+            zobristHash ^= ZOBRIST_PIECES[move.pieceCaptured][end]
+            self.pieceSquares[move.pieceCaptured[0]].remove(end)
+
+        if move.pieceMoved[1] == 'p' and abs(startRow - endRow) == 2:  # Solo se il pedone avanza di due case
+            self.enPassantPossible = ((startRow + endRow)//2, startCol)
+            zobristHash ^= ZOBRIST_EN_PASSANT[startCol]
         else:
             self.enPassantPossible = ()
 
         # Arrocco
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:  # Arrocco corto
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]  # Muove la torre nella nuova casella
-                self.board[move.endRow][move.endCol+1] = '--'  # Toglie la torre dalla vecchia posizione
+        if moveID & CASTLE_FLAG:
+            rook = move.pieceMoved[0] + 'R'
+            if endCol - startCol == 2:  # Arrocco corto
+                self.board[endRow][endCol-1] = self.board[endRow][endCol+1]  # Muove la torre nella nuova casella
+                self.board[endRow][endCol+1] = '--'  # Toglie la torre dalla vecchia posizione
+                zobristHash ^= ZOBRIST_PIECES[rook][end + 1] ^ ZOBRIST_PIECES[rook][end - 1]
+                allySquares.remove(end + 1)
+                allySquares.add(end - 1)
             else:  # Arrocco lungo
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]  # Muove la torre nella nuova casella
-                self.board[move.endRow][move.endCol-2] = '--'
+                self.board[endRow][endCol+1] = self.board[endRow][endCol-2]  # Muove la torre nella nuova casella
+                self.board[endRow][endCol-2] = '--'
+                zobristHash ^= ZOBRIST_PIECES[rook][end - 2] ^ ZOBRIST_PIECES[rook][end + 1]
+                allySquares.remove(end - 2)
+                allySquares.add(end + 1)
 
         # Aggiorna diritto ad arrocco - se re o torre vengono mossi
+        oldCastlingRights = self.castlingRights
         self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                             self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+        zobristHash ^= ZOBRIST_CASTLING[oldCastlingRights] ^ ZOBRIST_CASTLING[self.castlingRights]
+        self.zobristHash = zobristHash
+        if ZOBRIST_DEBUG:
+            assert zobristHash == self.computeZobristHash(), 'Hash di Zobrist incrementale errato'
 
     '''
     Annulla la mossa precedente
@@ -84,37 +336,53 @@ class GameState():
     def undoMove(self):
         if len(self.moveLog) != 0:  # Deve essere stata fatta una mossa
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            moveID = move.moveID
+            startRow, startCol = (moveID >> 3) & 7, moveID & 7
+            endRow, endCol = (moveID >> 9) & 7, (moveID >> 6) & 7
+            self.board[startRow][startCol] = move.pieceMoved
+            self.board[endRow][endCol] = move.pieceCaptured
+            allySquares = self.pieceSquares[move.pieceMoved[0]]
+            allySquares.remove(endRow * 8 + endCol)
+            allySquares.add(startRow * 8 + startCol)
+            if move.pieceCaptured != '--':
+                self.pieceSquares[move.pieceCaptured[0]].add(
+                    startRow * 8 + endCol if moveID & EN_PASSANT_FLAG else endRow * 8 + endCol)
             self.whiteToMove = not self.whiteToMove
+            materialDelta, positionDelta = self.moveScoreDelta(move)
+            self.materialScore -= materialDelta
+            self.positionScore -= positionDelta
             # Aggiorna la posizione del re, se necessario
             if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
+                self.whiteKingLocation = (startRow, startCol)
             if move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
+                self.blackKingLocation = (startRow, startCol)
             # Annulla en passant
-            if move.isEnPassantMove:
-                self.board[move.endRow][move.endCol] = '--'
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enPassantPossible = (move.endRow, move.endCol)
-            # Annulla un avanzamento di 2 case di un pedone
-            if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-                self.enPassantPossible = ()
-
-            # Annulla diritto ad arrocco
-            self.castleRightsLog.pop()
-            newRights = self.castleRightsLog[-1]
-            self.currentCastlingRight = CastleRights(newRights.wks, newRights.bks, newRights.wqs, newRights.bqs)
+            if moveID & EN_PASSANT_FLAG:
+                self.board[endRow][endCol] = '--'
+                self.board[startRow][endCol] = move.pieceCaptured
+            # Ripristina en passant, diritto ad arrocco, contatore delle semimosse e hash
+            state = self.undoStack.pop()
+            self.castlingRights = state & 15
+            self.enPassantPossible = EN_PASSANT_SQUARES[(state >> UNDO_EN_PASSANT_SHIFT) & 127]
+            self.halfmoveClock = (state >> UNDO_HALFMOVE_SHIFT) & 0xFFF
+            self.zobristHash = state >> UNDO_HASH_SHIFT
 
             # Annulla arrocco
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2:  # Arrocco corto
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = "--"
+            if moveID & CASTLE_FLAG:
+                end = endRow * 8 + endCol
+                if endCol - startCol == 2:  # Arrocco corto
+                    self.board[endRow][endCol+1] = self.board[endRow][endCol-1]
+                    self.board[endRow][endCol-1] = "--"
+                    allySquares.remove(end - 1)
+                    allySquares.add(end + 1)
                 else:  # Arrocco lungo
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                    self.board[move.endRow][move.endCol+1] = '--'
+                    self.board[endRow][endCol-2] = self.board[endRow][endCol+1]
+                    self.board[endRow][endCol+1] = '--'
+                    allySquares.remove(end + 1)
+                    allySquares.add(end - 2)
 
+            if ZOBRIST_DEBUG:
+                assert self.zobristHash == self.computeZobristHash(), 'Hash di Zobrist incrementale errato'
             self.checkMate = False
             self.staleMate = False
 
@@ -124,66 +392,90 @@ class GameState():
     Aggiorna il diritto ad arrocco della mossa move
     '''
     def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:  # Torre sinistra
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:  # Torre destra
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:  # Torre sinistra
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:  # Torre destra
-                    self.currentCastlingRight.bks = False
-
-
-    '''
-    Mosse con scacco (con inchiodatura)
+        # Una mossa che parte da (re o torre mossi) o arriva in (torre catturata) una casa iniziale
+        # toglie il diritto ad arrocco da quel lato
+        self.castlingRights &= CASTLING_RIGHTS_KEPT[move.moveID & 63] & CASTLING_RIGHTS_KEPT[(move.moveID >> 6) & 63]
+
+
+    '''
+    Mosse con scacco (con inchiodatura).
+    Scacchi e inchiodature vengono calcolati una sola volta, così vengono generate solo mosse legali.
     '''
     def getValidMoves(self):
-        tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                        self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
-        # 1.) Generare tutte le mosse
-        moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+        moves, inCheck = self.generateLegalMoves()
+        self.updateGameOver(len(moves) != 0, inCheck)
+        return moves
 
-        # 2.) Per ogni mossa, fai la mossa
-        for i in range(len(moves)-1, -1, -1):  # Quando rimuovi dalla lista, naviga all'indietro
-            self.makeMove(moves[i])
+    '''
+    Aggiorna checkMate e staleMate: senza mosse legali la partita è finita
+    '''
+    def updateGameOver(self, hasMoves, inCheck):
+        self.checkMate = not hasMoves and inCheck
+        self.staleMate = not hasMoves and not inCheck
 
-            # 3.) Genera tutte le mosse dell'avversario
-            # 4.) Per ogni mossa avversario, verifica se attacca il re
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                # 5.) Se attacca il re, non è una mossa valida
-                moves.remove(moves[i])
+    '''
+    Solo le catture e le promozioni a Regina legali (per la ricerca quiescente): le mosse tranquille non vengono
+    generate. Non aggiorna checkMate e staleMate, perché senza le altre mosse non si possono stabilire.
+    '''
+    def getValidCaptures(self, pinsAndChecks=None):
+        self.capturesOnly = True
+        moves = self.generateLegalMoves(pinsAndChecks=pinsAndChecks)[0]
+        self.capturesOnly = False
+        return moves
 
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+    '''
+    Tutte le mosse legali escluse quelle di getValidCaptures: mosse tranquille, arrocchi e sottopromozioni.
+    Come getValidCaptures non aggiorna checkMate e staleMate.
+    '''
+    def getValidQuietMoves(self, pinsAndChecks=None):
+        self.quietOnly = True
+        moves = self.generateLegalMoves(pinsAndChecks=pinsAndChecks)[0]
+        self.quietOnly = False
+        return moves
 
-        if len(moves) == 0:  # Scaccomatto o stallo
-            if self.inCheck():
-                self.checkMate = True
-            else:
-                self.staleMate = True
-        else:
-            self.checkMate = False
-            self.staleMate = False
+    '''
+    Solo le mosse legali del pezzo in (r, c): bastano per verificare una singola mossa
+    (ad esempio quella suggerita dalla tabella delle trasposizioni) senza generare tutte le altre
+    '''
+    def getValidMovesFrom(self, r, c, pinsAndChecks=None):
+        return self.generateLegalMoves((r, c), pinsAndChecks)[0]
 
-        self.enPassantPossible = tempEnPassantPossible
-        self.currentCastlingRight = tempCastleRights
-        return moves
+    '''
+    Genera le mosse legali (di tutti i pezzi o solo di quello in square) e ritorna (mosse, sottoScacco).
+    pinsAndChecks è il risultato di checkForPinsAndChecks per la posizione corrente: chi genera le mosse
+    di una posizione in più passi (la ricerca a fasi) lo calcola una volta sola.
+    '''
+    def generateLegalMoves(self, square=None, pinsAndChecks=None):
+        inCheck, self.pins, self.checks = pinsAndChecks if pinsAndChecks is not None else self.checkForPinsAndChecks()
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            kingRow, kingCol = self.blackKingLocation
+        kingMoves = square is None or square == (kingRow, kingCol)
+
+        if inCheck:
+            if len(self.checks) == 1:  # Scacco singolo: cattura il pezzo, blocca lo scacco o muovi il re
+                moves = self.getAllPossibleMoves() if square is None else self.getSquareMoves(*square)
+                checkRow, checkCol, dr, dc = self.checks[0]
+                validSquares = {(checkRow, checkCol)}
+                if self.board[checkRow][checkCol][1] != 'N':  # Lo scacco di un cavallo non si può bloccare
+                    for i in range(1, 8):
+                        square = (kingRow + dr * i, kingCol + dc * i)
+                        if square == (checkRow, checkCol):
+                            break
+                        validSquares.add(square)
+                moves = [move for move in moves if move.pieceMoved[1] == 'K'
+                         or (move.endRow, move.endCol) in validSquares
+                         or (move.isEnPassantMove and (move.startRow, move.endCol) in validSquares)]
+            else:  # Scacco doppio: si può solo muovere il re
+                moves = []
+                if kingMoves:
+                    self.getKingMoves(kingRow, kingCol, moves)
+        else:
+            moves = self.getAllPossibleMoves() if square is None else self.getSquareMoves(*square)
+            if kingMoves:
+                self.getCastleMoves(kingRow, kingCol, moves)
+        return moves, inCheck
 
     '''
     Verifica se il giocatore è sotto scacco
@@ -198,26 +490,160 @@ class GameState():
     Verifica se il nemico attacca la casa r, c
     '''
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove  # Cambia il turno
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove  # Cambia il turno
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:  # La casa è sotto attacco
-                return True
-        return False
+        return len(self.attackersOfSquare(r, c, firstOnly=True)) != 0
 
+    '''
+    Trova i pezzi nemici che attaccano la casa r, c guardando verso l'esterno dalla casa stessa:
+    nelle case da cui attaccherebbero pedoni, cavalli e re, e lungo righe, colonne e diagonali.
+    Ritorna l'insieme delle loro coordinate; con firstOnly=True si ferma al primo attaccante trovato.
+    '''
+    def attackersOfSquare(self, r, c, firstOnly=False):
+        attackers = set()
+        enemyColor = 'b' if self.whiteToMove else 'w'
+
+        # Un pedone bianco attacca dalla riga sotto, uno nero dalla riga sopra
+        pawnRow = r + 1 if enemyColor == 'w' else r - 1
+        if 0 <= pawnRow < 8:
+            for pawnCol in (c - 1, c + 1):
+                if 0 <= pawnCol < 8 and self.board[pawnRow][pawnCol] == enemyColor + 'p':
+                    attackers.add((pawnRow, pawnCol))
+                    if firstOnly:
+                        return attackers
+
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow][endCol] == enemyColor + 'N':
+                attackers.add((endRow, endCol))
+                if firstOnly:
+                    return attackers
+
+        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        for m in kingMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow][endCol] == enemyColor + 'K':
+                attackers.add((endRow, endCol))
+                if firstOnly:
+                    return attackers
+
+        # Torre e regina in orizzontale o verticale, alfiere e regina in diagonale
+        for directions, sliders in ((((-1, 0), (0, -1), (1, 0), (0, 1)), ('R', 'Q')),
+                                    (((-1, -1), (-1, 1), (1, -1), (1, 1)), ('B', 'Q'))):
+            for d in directions:
+                for i in range(1, 8):
+                    endRow = r + d[0] * i
+                    endCol = c + d[1] * i
+                    if not (0 <= endRow < 8 and 0 <= endCol < 8):  # Fuori scacchiera
+                        break
+                    endPiece = self.board[endRow][endCol]
+                    if endPiece != '--':  # Il primo pezzo incontrato blocca il raggio
+                        if endPiece[0] == enemyColor and endPiece[1] in sliders:
+                            attackers.add((endRow, endCol))
+                            if firstOnly:
+                                return attackers
+                        break
+        return attackers
 
     '''
-    Mosse senza scacco (senza inchiodatura) 
+    Partendo dal re, cerca lungo righe, colonne e diagonali i pezzi nemici che danno scacco
+    e i pezzi amici inchiodati (l'unico pezzo tra il re e un pezzo nemico che scorre su quella linea).
+    Ritorna (sottoScacco, inchiodature, scacchi): le inchiodature sono un dizionario casa -> direzione,
+    gli scacchi una lista di tuple (riga, colonna, direzione riga, direzione colonna).
+    '''
+    def checkForPinsAndChecks(self):
+        pins = {}
+        checks = []
+        inCheck = False
+        if self.whiteToMove:
+            enemyColor, allyColor = 'b', 'w'
+            startRow, startCol = self.whiteKingLocation
+        else:
+            enemyColor, allyColor = 'w', 'b'
+            startRow, startCol = self.blackKingLocation
+
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            possiblePin = ()
+            for i in range(1, 8):
+                endRow = startRow + d[0] * i
+                endCol = startCol + d[1] * i
+                if 0 <= endRow < 8 and 0 <= endCol < 8:
+                    endPiece = self.board[endRow][endCol]
+                    if endPiece[0] == allyColor:
+                        if possiblePin == ():  # Primo pezzo amico: potrebbe essere inchiodato
+                            possiblePin = (endRow, endCol)
+                        else:  # Secondo pezzo amico: nessuna inchiodatura né scacco in questa direzione
+                            break
+                    elif endPiece[0] == enemyColor:
+                        pieceType = endPiece[1]
+                        # 1.) Torre in orizzontale o verticale
+                        # 2.) Alfiere in diagonale
+                        # 3.) Pedone a una casa in diagonale (verso cui avanza)
+                        # 4.) Regina in qualsiasi direzione
+                        # 5.) Re a una casa in qualsiasi direzione
+                        if (0 <= j <= 3 and pieceType == 'R') or (4 <= j <= 7 and pieceType == 'B') or \
+                                (i == 1 and pieceType == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
+                                (pieceType == 'Q') or (i == 1 and pieceType == 'K'):
+                            if possiblePin == ():  # Nessun pezzo in mezzo: scacco
+                                inCheck = True
+                                checks.append((endRow, endCol, d[0], d[1]))
+                            else:  # Un pezzo amico in mezzo: inchiodatura
+                                pins[possiblePin] = d
+                        break  # Un pezzo nemico ferma comunque la ricerca
+                else:  # Fuori scacchiera
+                    break
+
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = startRow + m[0]
+            endCol = startCol + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                if self.board[endRow][endCol] == enemyColor + 'N':  # Scacco di cavallo
+                    inCheck = True
+                    checks.append((endRow, endCol, m[0], m[1]))
+        return inCheck, pins, checks
+
+    '''
+    Verifica se il re del giocatore di turno sarebbe al sicuro nella casa r, c.
+    Il re viene tolto dalla sua casa, così non fa da schermo agli attacchi lungo la linea dello scacco.
+    '''
+    def kingSafeAt(self, r, c):
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        king = self.board[kingRow][kingCol]
+        self.board[kingRow][kingCol] = '--'
+        safe = not self.squareUnderAttack(r, c)
+        self.board[kingRow][kingCol] = king
+        return safe
+
+    '''
+    Un pezzo inchiodato può muoversi solo lungo la linea dell'inchiodatura
+    '''
+    def pinAllows(self, r, c, d):
+        pinDirection = self.pins.get((r, c))
+        return pinDirection is None or pinDirection == d or pinDirection == (-d[0], -d[1])
+
+    '''
+    Mosse senza scacco (senza inchiodatura): scorre solo le case occupate dai pezzi del giocatore di turno
     '''
     def getAllPossibleMoves(self):
         moves = []
-        for r in range(len(self.board)):  # Numero di righe
-            for c in range(len(self.board[r])):  # Numero di colonne della riga r
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):  # Turno del bianco e muove un pezzo bianco
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)  # Chiama la funzione appropriata per ogni pezzo
+        board = self.board
+        for sq in self.pieceSquares['w' if self.whiteToMove else 'b']:
+            r, c = sq >> 3, sq & 7
+            self.moveFunctions[board[r][c][1]](r, c, moves)  # Chiama la funzione appropriata per ogni pezzo
+        return moves
+
+    '''
+    Mosse senza scacco del solo pezzo in (r, c), se appartiene al giocatore di turno
+    '''
+    def getSquareMoves(self, r, c):
+        moves = []
+        square = self.board[r][c]
+        if square[0] == ('w' if self.whiteToMove else 'b'):
+            self.moveFunctions[square[1]](r, c, moves)
         return moves
 
     '''
@@ -225,73 +651,86 @@ class GameState():
     '''
     def getPawnMoves(self, r, c, moves):
         if self.whiteToMove:
-            if self.board[r-1][c] == "--":  # Se la cella avanti è vuota
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == "--":  # Se la seconda cella avanti è vuota
-                    moves.append(Move((r, c), (r-2, c), self.board))
-            if c-1 > 0:  # Cattura a sinistra
-                if self.board[r-1][c-1][0] == 'b':  # Pezzo nemico da catturare
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board, isEnPassantMove=True))
-            if c+1 < 7:  # Cattura a destra
-                if self.board[r-1][c+1][0] == 'b':  # Pezzo nemico da catturare
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r - 1, c + 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board, isEnPassantMove=True))
-
-        else:  # Pedone nero
-            if self.board[r + 1][c] == "--":  # Se la cella avanti è vuota
-                moves.append(Move((r, c), (r + 1, c), self.board))
-                if r == 1 and self.board[r + 2][c] == "--":  # Se la seconda cella avanti è vuota
-                    moves.append(Move((r, c), (r + 2, c), self.board))
-            if c - 1 >= 0:  # Cattura a sinistra
-                if self.board[r + 1][c - 1][0] == 'w':  # Pezzo nemico da catturare
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r + 1, c - 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, isEnPassantMove=True))
-            if c + 1 <= 7:  # Cattura a destra
-                if self.board[r + 1][c + 1][0] == 'w':  # Pezzo nemico da catturare
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r + 1, c + 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, isEnPassantMove=True))
-        # Aggiungere promozione pedone
+            moveAmount, startRow, enemyColor, pawn = -1, 6, 'b', 'wp'
+        else:
+            moveAmount, startRow, enemyColor, pawn = 1, 1, 'w', 'bp'
+        start = r * 8 + c
+        endRow = r + moveAmount
+        if endRow == 0 or endRow == 7:  # Promozione: una mossa per pezzo (solo Regina se servono le catture)
+            if self.capturesOnly:
+                promotions = PROMOTION_MOVE_FLAGS[:1]
+            elif self.quietOnly:  # Le sottopromozioni sono nelle mosse tranquille
+                promotions = PROMOTION_MOVE_FLAGS[1:]
+            else:
+                promotions = PROMOTION_MOVE_FLAGS
+        else:
+            promotions = (0,)
+
+        if self.board[endRow][c] == "--" and self.pinAllows(r, c, (moveAmount, 0)) \
+                and (promotions[0] or not self.capturesOnly):  # Se la cella avanti è vuota
+            for flags in promotions:
+                moves.append(Move.fromID(start | (endRow * 8 + c) << 6 | flags, pawn, "--"))
+            if r == startRow and self.board[r + 2 * moveAmount][c] == "--" and not self.capturesOnly:  # Se la seconda cella avanti è vuota
+                moves.append(Move.fromID(start | ((r + 2 * moveAmount) * 8 + c) << 6, pawn, "--"))
+        if self.quietOnly and not promotions[0]:  # Catture ed en passant non sono mosse tranquille
+            return
+        for dc in (-1, 1):  # Cattura a sinistra e a destra
+            endCol = c + dc
+            if 0 <= endCol < 8 and self.pinAllows(r, c, (moveAmount, dc)):
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == enemyColor:  # Pezzo nemico da catturare
+                    for flags in promotions:
+                        moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6 | flags, pawn, endPiece))
+                elif (endRow, endCol) == self.enPassantPossible and self.enPassantSafe(r, c, endCol):
+                    moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6 | EN_PASSANT_FLAG, pawn, enemyColor + 'p'))
+
+    '''
+    L'en passant toglie due pedoni dalla stessa riga: se su quella riga c'è il re, 
+    verifica che non resti esposto a una torre o a una regina nemica
+    '''
+    def enPassantSafe(self, r, c, capturedCol):
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
+            enemyColor = 'b'
+        else:
+            kingRow, kingCol = self.blackKingLocation
+            enemyColor = 'w'
+        if kingRow != r:
+            return True
+        step = 1 if kingCol < c else -1
+        col = kingCol + step
+        while 0 <= col < 8:
+            if col != c and col != capturedCol:  # I due pedoni coinvolti non ci saranno più
+                piece = self.board[r][col]
+                if piece != '--':
+                    return not (piece[0] == enemyColor and piece[1] in ('R', 'Q'))
+            col += step
+        return True
 
     '''
     Genera le mosse della torre
     '''
     def getRookMoves(self, r, c, moves):
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # Sopra, sinistra, sotto, destra
-        enemyColor = 'b' if self.whiteToMove else 'w'
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # Sulla scacchiera
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == '--':  # Spazio vuoto valido
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:  # Pezzo nemico
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:  # Pezzo amico
-                        break
-                else:  # Fuori scacchiera
-                    break
+        self.getSlidingMoves(r, c, directions, moves)
 
     '''
     Genera le mosse del cavallo
     '''
     def getKnightMoves(self, r, c, moves):
+        if (r, c) in self.pins:  # Un cavallo inchiodato non può muoversi
+            return
         knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))  # L
         allyColor = 'w' if self.whiteToMove else 'b'
+        start = r * 8 + c
         for m in knightMoves:
             endRow = r + m[0]
             endCol = c + m[1]
             if 0 <= endRow < 8 and 0 <= endCol < 8:
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # Non è un pezzo amico (vuoto o pezzo nemico)
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                if endPiece[0] != allyColor and (endPiece != '--' or not self.capturesOnly) \
+                        and (endPiece == '--' or not self.quietOnly):  # Non è un pezzo amico (vuoto o pezzo nemico)
+                    moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6, allyColor + 'N', endPiece))
 
     '''
     Genera le mosse della regina
@@ -305,17 +744,29 @@ class GameState():
     '''
     def getBishopMoves(self, r, c, moves):
         directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # Diagonali
+        self.getSlidingMoves(r, c, directions, moves)
+
+    '''
+    Genera le mosse di un pezzo che scorre lungo le direzioni date (torre, alfiere, regina)
+    '''
+    def getSlidingMoves(self, r, c, directions, moves):
         enemyColor = 'b' if self.whiteToMove else 'w'
+        piece = self.board[r][c]
+        start = r * 8 + c
         for d in directions:
+            if not self.pinAllows(r, c, d):
+                continue
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8:  # Sulla scacchiera
                     endPiece = self.board[endRow][endCol]
                     if endPiece == '--':  # Spazio vuoto valido
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.capturesOnly:
+                            moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6, piece, endPiece))
                     elif endPiece[0] == enemyColor:  # Pezzo nemico
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.quietOnly:
+                            moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6, piece, endPiece))
                         break
                     else:  # Pezzo amico
                         break
@@ -323,46 +774,42 @@ class GameState():
                     break
 
     '''
-    Genera le mosse del re
+    Genera le mosse del re (solo verso case non attaccate)
     '''
     def getKingMoves(self, r, c, moves):
         kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))  # Una casella adiacente
         allyColor = 'w' if self.whiteToMove else 'b'
+        start = r * 8 + c
         for i in range(8):
             endRow = r + kingMoves[i][0]
             endCol = c + kingMoves[i][1]
             if 0 <= endRow < 8 and 0 <= endCol < 8:
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # Non è un pezzo amico (vuoto o pezzo nemico)
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                if endPiece[0] != allyColor and (endPiece != '--' or not self.capturesOnly) \
+                        and (endPiece == '--' or not self.quietOnly) \
+                        and self.kingSafeAt(endRow, endCol):  # Non è un pezzo amico (vuoto o pezzo nemico)
+                    moves.append(Move.fromID(start | (endRow * 8 + endCol) << 6, allyColor + 'K', endPiece))
 
     '''
     Genera le mosse per arroccare
     '''
     def getCastleMoves(self, r, c, moves):
-        if self.squareUnderAttack(r, c):
+        if self.checks or self.capturesOnly:
             return  # Impossibile arroccare sotto scacco
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
+        if self.castlingRights & (WHITE_KING_SIDE if self.whiteToMove else BLACK_KING_SIDE):
             self.getKingSideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
+        if self.castlingRights & (WHITE_QUEEN_SIDE if self.whiteToMove else BLACK_QUEEN_SIDE):
             self.getQueenSideCastleMoves(r, c, moves)
 
     def getKingSideCastleMoves(self, r, c, moves):
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-            if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove=True))
+            if self.kingSafeAt(r, c+1) and self.kingSafeAt(r, c+2):  # Il re non può attraversare case attaccate
+                moves.append(Move.fromID((r * 8 + c) | (r * 8 + c + 2) << 6 | CASTLE_FLAG, self.board[r][c], '--'))
 
     def getQueenSideCastleMoves(self, r, c, moves):
-        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3 == '--']:
-            if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
-
-class CastleRights():
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
+            if self.kingSafeAt(r, c-1) and self.kingSafeAt(r, c-2):
+                moves.append(Move.fromID((r * 8 + c) | (r * 8 + c - 2) << 6 | CASTLE_FLAG, self.board[r][c], '--'))
 
 class Move():
     # Mappa le chiavi ai valori
@@ -374,35 +821,85 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
+    # La mossa è codificata in moveID (vedi PROMOTION_FLAG e seguenti): niente __dict__ per ogni istanza
+    __slots__ = ('moveID', 'pieceMoved', 'pieceCaptured')
+
+    def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False, promotionChoice='Q'):
+        self.moveID = (startSq[0] * 8 + startSq[1]) | (endSq[0] * 8 + endSq[1]) << 6
+        self.pieceMoved = board[startSq[0]][startSq[1]]
+        self.pieceCaptured = board[endSq[0]][endSq[1]]
 
         # Promozione
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7)
+        if (self.pieceMoved == 'wp' and endSq[0] == 0) or (self.pieceMoved == 'bp' and endSq[0] == 7):
+            self.moveID |= PROMOTION_FLAG | PROMOTION_PIECES.index(promotionChoice) << PROMOTION_SHIFT
 
         # En passant
-        self.isEnPassantMove = isEnPassantMove
-        if self.isEnPassantMove:
+        if isEnPassantMove:
+            self.moveID |= EN_PASSANT_FLAG
             self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
 
         # Arrocco
-        self.isCastleMove = isCastleMove
+        if isCastleMove:
+            self.moveID |= CASTLE_FLAG
+
+    '''
+    Crea una mossa già codificata senza rileggere la scacchiera (usato dai generatori di mosse)
+    '''
+    @classmethod
+    def fromID(cls, moveID, pieceMoved, pieceCaptured):
+        move = cls.__new__(cls)
+        move.moveID = moveID
+        move.pieceMoved = pieceMoved
+        move.pieceCaptured = pieceCaptured
+        return move
+
+    @property
+    def startRow(self):
+        return (self.moveID >> 3) & 7
+
+    @property
+    def startCol(self):
+        return self.moveID & 7
+
+    @property
+    def endRow(self):
+        return (self.moveID >> 9) & 7
+
+    @property
+    def endCol(self):
+        return (self.moveID >> 6) & 7
+
+    @property
+    def isPawnPromotion(self):
+        return self.moveID & PROMOTION_FLAG != 0
+
+    @property
+    def isEnPassantMove(self):
+        return self.moveID & EN_PASSANT_FLAG != 0
+
+    @property
+    def isCastleMove(self):
+        return self.moveID & CASTLE_FLAG != 0
 
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+    '''
+    Pezzo che prende il posto del pedone promosso (None se la mossa non è una promozione)
+    '''
+    @property
+    def promotionPiece(self):
+        if self.moveID & PROMOTION_FLAG:
+            return self.pieceMoved[0] + PROMOTION_PIECES[(self.moveID >> PROMOTION_SHIFT) & 3]
+        return None
 
     '''
-    Override del metodo equals
+    Override del metodo equals: confronta case di partenza, di arrivo e pezzo promosso
     '''
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.moveID == other.moveID
+            return self.moveID & MOVE_KEY_MASK == other.moveID & MOVE_KEY_MASK
         return False
 
+    def __hash__(self):
+        return hash(self.moveID & MOVE_KEY_MASK)
 
     def getChessNotation(self):
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
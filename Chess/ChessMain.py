@@ -4,14 +4,17 @@ corrente.
 """
 # Creare log mosse
 
+import queue
 import pygame as p
 from Chess import ChessEngine, SmartMoveFinder
-from multiprocessing import Process, Queue
+from Chess.EngineWorker import EngineWorker
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+USE_BITBOARDS = True  # GameState basato su bitboard (stessa interfaccia, generazione mosse più veloce)
+PONDER = True  # Durante il turno dell'utente il motore cerca già la risposta alla mossa che si aspetta
 IMAGES = {}
 
 '''
@@ -31,8 +34,10 @@ def main():
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
+    gs = ChessEngine.GameState(USE_BITBOARDS)
     validMoves = gs.getValidMoves()
+    engine = EngineWorker(USE_BITBOARDS)  # Processo del motore, attivo per tutta la partita
+    engine.start()
     moveMade = False  # Flag per una mossa compiuta
     animate = False
     loadImages()
@@ -47,7 +52,6 @@ def main():
     playerOne = True  # Se gioca l'utente la variabile è True, altrimenti False
     playerTwo = False  # Uguale a playerOne
     AIThinking = False
-    moveFinderProcess = None
     moveUndone = False
 
     while running:
@@ -84,40 +88,43 @@ def main():
                     moveMade = True
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
-                        AIThinking = False
+                    engine.stop()  # Annulla anche l'eventuale pondering
+                    AIThinking = False
                     moveUndone = True
 
                 if e.key == p.K_r:  # Resetta la scacchiera con R
-                    gs = ChessEngine.GameState()
+                    gs = ChessEngine.GameState(USE_BITBOARDS)
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
-                        AIThinking = False
+                    engine.newGame()
+                    AIThinking = False
                     moveUndone = True
 
         # Ricerca mosse AI
         if not gameOver and not humanTurn and not moveUndone:
             if not AIThinking:
                 AIThinking = True
-                returnQueue = Queue() # Sfruttata tra i thread per scambio dati
-                moveFinderProcess = Process(target=SmartMoveFinder.findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start()
-
-            if not moveFinderProcess.is_alive():
-                AIMove = returnQueue.get()
+                if not engine.ponderHit(gs):  # Se l'utente ha giocato la mossa prevista la ricerca continua
+                    engine.search(gs)  # Il motore riceve solo la FEN e le mosse giocate dall'ultima ricerca
+
+            if engine.poll():
+                AIMove = engine.getBestMove(validMoves)
+                if AIMove is None and not engine.isAlive():  # Il processo del motore è terminato: si cerca qui
+                    returnQueue = queue.Queue()
+                    SmartMoveFinder.findBestMove(gs, validMoves, returnQueue)
+                    AIMove = returnQueue.get()
                 if AIMove is None:
                     AIMove = SmartMoveFinder.findRandomMove(validMoves)
                 gs.makeMove(AIMove)
                 moveMade = True
                 animate = True
                 AIThinking = False
+                if PONDER and ((gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)):
+                    engine.ponder(gs)
 
         if moveMade:
             if animate:
@@ -141,6 +148,7 @@ def main():
 
         clock.tick(MAX_FPS)
         p.display.flip()
+    engine.quit()
 
 '''
 Evidenzia le case per il pezzo selezionato
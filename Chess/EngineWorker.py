@@ -0,0 +1,232 @@
+"""
+Processo del motore che resta attivo per tutta la partita.
+L'interfaccia non crea più un Process per ogni mossa dell'AI: invia al processo del motore solo la posizione
+(FEN più le ultime mosse giocate) e riceve il moveID della mossa scelta. Il processo tiene in memoria il proprio
+GameState e la tabella delle trasposizioni di SmartMoveFinder, che restano utili da una mossa all'altra.
+Durante il turno dell'utente il motore può "pensare sul tempo dell'avversario" (pondering): cerca la posizione
+che si avrebbe se l'utente giocasse la risposta prevista dalla variante principale.
+Il processo non è daemon, perché la ricerca parallela (findBestMove con workers > 1) crea a sua volta una pool
+di processi: viene chiuso da quit oppure, se l'interfaccia termina senza chiamarlo, all'uscita del programma.
+"""
+
+import atexit
+import queue
+import time
+from multiprocessing import Process, Queue, Value
+from Chess import ChessEngine, SmartMoveFinder
+
+QUIT_TIMEOUT = 1.0  # Secondi concessi al motore per chiudersi da solo, poi il processo viene terminato
+
+
+class EngineWorker():
+    '''
+    Lato interfaccia del processo del motore. I messaggi verso il processo sono tuple:
+    ('go', idRicerca, FEN, moveID giocati dall'ultimo invio oppure None, opzioni di findBestMove,
+    moveID della mossa prevista da giocare prima di cercare oppure None), ('newgame',) e ('quit',).
+    Una ricerca in corso non legge la coda dei messaggi, quindi lo stop passa da valori condivisi:
+    activeSearch (la ricerca si interrompe appena non coincide più con il suo id) e ponderDeadline
+    (se diverso da 0, l'istante time.time() in cui la ricerca deve terminare).
+    '''
+    def __init__(self, useBitboards=True):
+        self.commands = Queue()
+        self.results = Queue()
+        self.activeSearch = Value('i', 0)  # Id della ricerca che il motore deve completare (0 = nessuna)
+        self.ponderDeadline = Value('d', 0.0)  # Scadenza della ricerca fatta durante il turno dell'utente
+        self.searchId = 0
+        self.bestMoveID = None
+        self.ponderMoveID = None  # Risposta dell'utente prevista dall'ultima ricerca
+        self.pondering = False
+        self.ponderPly = 0  # Lunghezza di moveLog quando è iniziato il pondering
+        self.ponderStart = 0.0  # Istante time.time() in cui è iniziato il pondering
+        self.sentPly = 0  # Lunghezza di moveLog all'ultimo invio
+        self.lastSentMove = None  # Ultima mossa di moveLog all'ultimo invio
+        self.process = Process(target=engineLoop, args=(self.commands, self.results, self.activeSearch,
+                                                         self.ponderDeadline, useBitboards))
+
+    def start(self):
+        self.process.start()
+        # Se l'interfaccia termina senza chiamare quit: le funzioni di atexit vengono eseguite in ordine inverso
+        # di registrazione, quindi questa viene eseguita prima di quella con cui multiprocessing (importato prima)
+        # attende i processi figli non daemon
+        atexit.register(self.shutdown)
+
+    '''
+    Avvia la ricerca della mossa migliore per la posizione di gs (opzioni: maxDepth, timeLimit, nodeLimit, ...)
+    '''
+    def search(self, gs, ponderMoveID=None, **options):
+        self.searchId += 1
+        self.bestMoveID = None
+        self.pondering = False
+        self.ponderDeadline.value = 0.0
+        self.activeSearch.value = self.searchId
+        # Se la partita è proseguita dall'ultimo invio bastano le nuove mosse, altrimenti (mosse annullate,
+        # nuova partita) il motore ricarica la posizione dalla FEN
+        moveLog = gs.moveLog
+        if self.sentPly <= len(moveLog) and (self.sentPly == 0 or moveLog[self.sentPly - 1] is self.lastSentMove):
+            moveIDs = [move.moveID for move in moveLog[self.sentPly:]]
+        else:
+            moveIDs = None
+        self.sentPly = len(moveLog)
+        self.lastSentMove = moveLog[-1] if moveLog else None
+        self.commands.put(('go', self.searchId, gs.getFen(), moveIDs, options, ponderMoveID))
+
+    '''
+    Durante il turno dell'utente cerca, senza limite di tempo, la posizione dopo la risposta prevista.
+    Ritorna False se l'ultima ricerca non ha previsto una risposta.
+    '''
+    def ponder(self, gs, **options):
+        if self.ponderMoveID is None:
+            return False
+        ponderMoveID = self.ponderMoveID
+        options['timeLimit'] = None
+        self.search(gs, ponderMoveID, **options)
+        self.pondering = True
+        self.ponderMoveID = ponderMoveID
+        self.ponderPly = len(gs.moveLog)
+        self.ponderStart = time.time()
+        return True
+
+    '''
+    Da chiamare quando l'utente ha mosso: se ha giocato la mossa prevista la ricerca del pondering diventa
+    la ricerca della risposta e ritorna True. Il tempo passato a pensare durante il turno dell'utente conta nei
+    timeLimit secondi della mossa: la ricerca termina timeLimit secondi dopo l'inizio del pondering, oppure subito
+    (con la mossa dell'ultima iterazione completata) se sono già trascorsi.
+    Altrimenti ritorna False: la ricerca successiva sostituirà quella del pondering.
+    '''
+    def ponderHit(self, gs, timeLimit=SmartMoveFinder.TIME_LIMIT):
+        if self.pondering and len(gs.moveLog) == self.ponderPly + 1 and gs.moveLog[-1].moveID == self.ponderMoveID:
+            self.pondering = False
+            if timeLimit is not None:
+                self.ponderDeadline.value = max(time.time(), self.ponderStart + timeLimit)
+            return True
+        return False
+
+    '''
+    Annulla la ricerca in corso (anche quella del pondering): il suo risultato verrà ignorato
+    '''
+    def stop(self):
+        self.activeSearch.value = 0
+        self.searchId += 1
+        self.pondering = False
+
+    '''
+    Ritorna True quando è arrivato il risultato della ricerca corrente (non bloccante), oppure quando
+    il processo del motore è terminato (ad esempio per un errore): in quel caso bestMoveID resta None
+    e isAlive ritorna False, così l'interfaccia può scegliere la mossa in un altro modo invece di attendere
+    '''
+    def poll(self):
+        while True:
+            try:
+                searchId, moveID, ponderMoveID = self.results.get_nowait()
+            except queue.Empty:
+                if not self.isAlive():  # Nessun risultato potrà più arrivare
+                    self.bestMoveID = None
+                    self.ponderMoveID = None
+                    return True
+                return False
+            if searchId == self.searchId:  # I risultati di ricerche annullate vengono scartati
+                self.bestMoveID = moveID
+                self.ponderMoveID = ponderMoveID
+                return True
+
+    def isAlive(self):
+        return self.process.is_alive()
+
+    '''
+    La mossa scelta dal motore tra validMoves, oppure None se non ne ha trovata una
+    '''
+    def getBestMove(self, validMoves):
+        for move in validMoves:
+            if move.moveID == self.bestMoveID:
+                return move
+        return None
+
+    '''
+    Svuota la tabella delle trasposizioni del motore (da chiamare quando inizia una nuova partita)
+    '''
+    def newGame(self):
+        self.stop()
+        self.sentPly = 0
+        self.lastSentMove = None
+        self.commands.put(('newgame',))
+
+    def quit(self):
+        self.stop()
+        atexit.unregister(self.shutdown)
+        self.shutdown()
+
+    '''
+    Chiude il processo del motore: prima con il comando quit (la ricerca in corso viene annullata),
+    poi, se non risponde entro QUIT_TIMEOUT secondi, terminandolo
+    '''
+    def shutdown(self):
+        self.activeSearch.value = 0
+        if self.process.is_alive():
+            self.commands.put(('quit',))
+            self.process.join(QUIT_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+'''
+Ciclo del processo del motore: aggiorna la posizione, cerca e risponde con
+(idRicerca, moveID o None, moveID della risposta prevista o None)
+'''
+def engineLoop(commands, results, activeSearch, ponderDeadline, useBitboards):
+    gs = ChessEngine.GameState(useBitboards)
+    # Id della ricerca in corso in un valore condiviso: i processi della ricerca parallela vengono creati una volta
+    # sola ed ereditano stopSearch, quindi non possono confrontare activeSearch con l'id di una ricerca specifica
+    runningSearch = Value('i', 0)
+
+    def stopSearch():
+        return activeSearch.value != runningSearch.value or 0 < ponderDeadline.value <= time.time()
+
+    while True:
+        command = commands.get()
+        if command[0] == 'quit':
+            break
+        elif command[0] == 'newgame':
+            SmartMoveFinder.clearTranspositionTable()
+        elif command[0] == 'go':
+            _, searchId, fen, moveIDs, options, ponderMoveID = command
+            syncPosition(gs, fen, moveIDs)
+            if activeSearch.value != searchId:  # Annullata prima di cominciare
+                continue
+            ponderMove = None
+            if ponderMoveID is not None:  # Pondering: cerca la posizione dopo la risposta prevista
+                ponderMove = SmartMoveFinder.findValidMove(gs, ponderMoveID)
+                if ponderMove is None:
+                    results.put((searchId, None, None))
+                    continue
+                gs.makeMove(ponderMove)
+            runningSearch.value = searchId
+            SmartMoveFinder.stopSearch = stopSearch
+            returnQueue = queue.Queue()
+            SmartMoveFinder.findBestMove(gs, gs.getValidMoves(), returnQueue, **options)
+            move = returnQueue.get()
+            if move is None and activeSearch.value == searchId and gs.getValidMoves():
+                # La scadenza è arrivata prima della fine della prima iterazione: basta una ricerca a profondità 1
+                SmartMoveFinder.stopSearch = None
+                SmartMoveFinder.findBestMove(gs, gs.getValidMoves(), returnQueue, maxDepth=1)
+                move = returnQueue.get()
+            pv = SmartMoveFinder.principalVariation
+            if ponderMove is not None:  # Il GameState del motore resta allineato alla posizione inviata
+                gs.undoMove()
+            results.put((searchId, move.moveID if move is not None else None, pv[1] if len(pv) > 1 else None))
+
+
+'''
+Porta gs nella posizione fen: se possibile giocando le mosse moveIDs (così la storia della partita resta
+continua), altrimenti caricando direttamente la FEN
+'''
+def syncPosition(gs, fen, moveIDs):
+    if moveIDs is not None:
+        for moveID in moveIDs:
+            move = SmartMoveFinder.findValidMove(gs, moveID)
+            if move is None:
+                break
+            gs.makeMove(move)
+        if gs.getFen() == fen:
+            return
+    gs.loadFen(fen)
@@ -0,0 +1,246 @@
+"""
+Libro delle aperture in formato binario, simile a Polyglot.
+Il file è una sequenza di voci da 16 byte (hash di Zobrist della posizione, moveID, peso), ordinate per hash:
+la ricerca è binaria su un file mappato in memoria (mmap), quindi non serve caricarlo e più processi che
+aprono lo stesso libro condividono le stesse pagine. Le chiavi sono gli hash di GameState (ChessEngine),
+non quelli di Polyglot: un libro va costruito con questo modulo. Come in getFen, dopo ogni spinta di due case
+la casa en passant fa parte della posizione (e dell'hash) anche se nessun pedone può catturare.
+Uso (dalla radice del repository):
+    python -m Chess.OpeningBook --build SmartChess/Matches                  # costruisce Chess/book.bin dalle PGN
+    python -m Chess.OpeningBook --build partite.pgn --output libro.bin --plies 16
+    python -m Chess.OpeningBook --fen "<FEN>"                               # mosse del libro per una posizione
+"""
+
+import argparse
+import collections
+import mmap
+import os
+import random
+import re
+import struct
+from Chess import ChessEngine
+
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')  # Libro usato di default
+BOOK_PLIES = 20  # Semimosse di ogni partita inserite nel libro
+ENTRY = struct.Struct('>QIH2x')  # hash (64 bit), moveID (32 bit), peso (16 bit), 2 byte di riempimento
+MAX_WEIGHT = 0xFFFF
+# Peso di una mossa in base al risultato della partita per chi l'ha giocata (come Polyglot: 2 vittoria, 1 patta)
+RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1), '*': (1, 1)}
+
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+class OpeningBook():
+    '''
+    Libro aperto in sola lettura. Ogni voce è (hash, moveID, peso); le voci della stessa posizione sono contigue.
+    '''
+    def __init__(self, path=BOOK_FILE):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size != 0:
+            self.file.close()
+            raise ValueError('%s: dimensione non multipla di %d byte' % (path, ENTRY.size))
+        self.entries = size // ENTRY.size
+        # mmap non accetta file vuoti: un libro vuoto non ha voci da mappare
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+    '''
+    Indice della prima voce con hash maggiore o uguale a key (ricerca binaria)
+    '''
+    def lowerBound(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('>Q', self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    '''
+    Lista di (moveID, peso) della posizione con hash key (vuota se la posizione non è nel libro)
+    '''
+    def probe(self, key):
+        moves = []
+        index = self.lowerBound(key) if self.entries else 0
+        while index < self.entries:
+            entryKey, moveID, weight = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entryKey != key:
+                break
+            moves.append((moveID, weight))
+            index += 1
+        return moves
+
+    '''
+    Sceglie a caso, in proporzione al peso, una mossa del libro tra le mosse legali validMoves della posizione
+    con hash key; None se non ce ne sono (le mosse vengono confrontate con quelle legali perché due posizioni
+    diverse possono avere lo stesso hash)
+    '''
+    def findMove(self, key, validMoves):
+        legalMoves = {move.moveID: move for move in validMoves}
+        candidates = [(legalMoves[moveID], weight) for moveID, weight in self.probe(key)
+                      if moveID in legalMoves and weight > 0]
+        if not candidates:
+            return None
+        return random.choices([move for move, _ in candidates], [weight for _, weight in candidates])[0]
+
+
+'''
+Divide il testo di un file PGN in partite: ritorna una lista di (risultato, lista di mosse in notazione SAN)
+'''
+def readPgnGames(text):
+    games = []
+    result = '*'
+    moveText = []
+    for line in text.splitlines() + ['[Event ""]']:  # L'ultima intestazione chiude l'ultima partita
+        line = line.strip()
+        if line.startswith('['):
+            if moveText:
+                games.append((result, parseMoveText(' '.join(moveText))))
+                moveText = []
+                result = '*'
+            match = re.match(r'\[Result\s+"([^"]*)"\]', line)
+            if match:
+                result = match.group(1)
+        elif line and not line.startswith('%'):
+            moveText.append(line)
+    return games
+
+
+'''
+Estrae le mosse SAN dal testo delle mosse di una partita, ignorando commenti, varianti, numeri e NAG
+'''
+def parseMoveText(moveText):
+    moveText = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', moveText)
+    while '(' in moveText:  # Varianti, anche annidate: si tolgono dall'interno verso l'esterno
+        stripped = re.sub(r'\([^()]*\)', ' ', moveText)
+        if stripped == moveText:
+            break
+        moveText = stripped
+    sanMoves = []
+    for token in moveText.split():
+        token = re.sub(r'^\d+\.+', '', token)  # "1." e "1..." possono essere attaccati alla mossa
+        if not token or token.startswith('$') or token in RESULT_WEIGHTS:
+            continue
+        sanMoves.append(token)
+    return sanMoves
+
+
+'''
+Ritorna la mossa legale di gs scritta in notazione SAN, oppure None se non esiste o è ambigua
+'''
+def parseSan(gs, san):
+    san = san.rstrip('+#!?')
+    validMoves = gs.getValidMoves()
+    if san.replace('0', 'O') in ('O-O', 'O-O-O'):
+        kingSide = san.replace('0', 'O') == 'O-O'
+        for move in validMoves:
+            if move.isCastleMove and (move.endCol > move.startCol) == kingSide:
+                return move
+        return None
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        return None
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    piece = piece or 'p'
+    endRow = ChessEngine.Move.ranksToRows[target[1]]
+    endCol = ChessEngine.Move.filesToCols[target[0]]
+    found = None
+    for move in validMoves:
+        if move.pieceMoved[1] != piece or move.endRow != endRow or move.endCol != endCol:
+            continue
+        if fromFile is not None and move.startCol != ChessEngine.Move.filesToCols[fromFile]:
+            continue
+        if fromRank is not None and move.startRow != ChessEngine.Move.ranksToRows[fromRank]:
+            continue
+        if move.isPawnPromotion and move.promotionPiece[1] != (promotion or 'Q'):
+            continue
+        if found is not None:  # Ambigua
+            return None
+        found = move
+    return found
+
+
+'''
+Conta i pesi di ogni (hash, moveID) nelle prime plies semimosse delle partite dei file PGN in paths
+(file o cartelle). Ritorna il dizionario dei pesi e il numero di partite lette.
+'''
+def collectBookMoves(paths, plies=BOOK_PLIES):
+    weights = collections.Counter()
+    games = 0
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith('.pgn')]
+        else:
+            files = [path]
+        for fileName in files:
+            with open(fileName, encoding='utf-8', errors='replace') as file:
+                for result, sanMoves in readPgnGames(file.read()):
+                    games += 1
+                    gs = ChessEngine.GameState()
+                    for san in sanMoves[:plies]:
+                        move = parseSan(gs, san)
+                        if move is None:  # Mossa non riconosciuta: il resto della partita viene ignorato
+                            print('%s: mossa non valida %s' % (fileName, san))
+                            break
+                        weight = RESULT_WEIGHTS.get(result, (1, 1))[0 if gs.whiteToMove else 1]
+                        weights[gs.zobristHash, move.moveID] += weight
+                        gs.makeMove(move)
+    return weights, games
+
+
+'''
+Scrive il libro: voci ordinate per hash (a parità di hash per peso decrescente), senza le mosse di peso 0.
+I pesi della stessa posizione vengono scalati in proporzione se superano MAX_WEIGHT.
+'''
+def writeBook(weights, path=BOOK_FILE):
+    positions = collections.defaultdict(list)
+    for (key, moveID), weight in weights.items():
+        if weight > 0:
+            positions[key].append((moveID, weight))
+    entries = 0
+    with open(path, 'wb') as file:
+        for key in sorted(positions):
+            moves = positions[key]
+            largest = max(weight for _, weight in moves)
+            for moveID, weight in sorted(moves, key=lambda item: (-item[1], item[0])):
+                if largest > MAX_WEIGHT:
+                    weight = max(1, weight * MAX_WEIGHT // largest)
+                file.write(ENTRY.pack(key, moveID, weight))
+                entries += 1
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Costruzione e consultazione del libro delle aperture')
+    parser.add_argument('--build', nargs='+', metavar='PGN', help='file PGN o cartelle da cui costruire il libro')
+    parser.add_argument('--output', default=BOOK_FILE, help='file del libro da scrivere o leggere')
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES, help='semimosse di ogni partita da inserire')
+    parser.add_argument('--fen', help='stampa le mosse del libro per questa posizione')
+    args = parser.parse_args()
+
+    if args.build:
+        weights, games = collectBookMoves(args.build, args.plies)
+        entries = writeBook(weights, args.output)
+        print('%d games, %d entries written to %s' % (games, entries, args.output))
+    if args.fen:
+        gs = ChessEngine.GameState()
+        gs.loadFen(args.fen)
+        book = OpeningBook(args.output)
+        moves = book.probe(gs.zobristHash)
+        total = sum(weight for _, weight in moves)
+        legalMoves = {move.moveID: move for move in gs.getValidMoves()}
+        for moveID, weight in moves:
+            move = legalMoves.get(moveID)
+            print('%6s %6d %5.1f%%' % (move.getChessNotation() if move else '?', weight, 100 * weight / total))
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Perft e divide per verificare e misurare la generazione delle mosse di GameState.
+Conta le foglie dell'albero delle mosse legali fino a una profondità fissa e confronta il risultato
+con i valori noti delle posizioni di riferimento. Uso (dalla radice del repository):
+    python -m Chess.Perft                          # suite completa, con tempi e nodi/secondo
+    python -m Chess.Perft --output perft.json      # salva i risultati come baseline JSON
+    python -m Chess.Perft --baseline perft.json    # confronta i tempi con una baseline salvata
+    python -m Chess.Perft --divide 3 --fen "<FEN>" # nodi per ogni mossa della radice
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from Chess import ChessEngine
+
+# Posizioni di riferimento (https://www.chessprogramming.org/Perft_Results):
+# nome, FEN, numero di nodi alle profondità 1, 2, 3, ... e profondità usata di default dalla suite
+POSITIONS = [
+    ('startpos', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609], 4),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603], 3),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624], 4),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333], 3),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487], 3),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594], 3),
+]
+
+
+'''
+Numero di foglie dell'albero delle mosse legali a profondità depth (all'ultimo livello basta contare le mosse)
+'''
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+'''
+Perft suddiviso per mossa della radice: utile per trovare la mossa in cui il conteggio diverge
+'''
+def divide(gs, depth):
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        notation = move.getChessNotation()
+        if move.isPawnPromotion:
+            notation += move.promotionPiece[1].lower()
+        counts[notation] = perft(gs, depth - 1)
+        gs.undoMove()
+    return counts
+
+
+'''
+Esegue perft su ogni posizione della suite e ritorna i risultati (nodi, tempo, nodi/secondo, esito)
+'''
+def runSuite(useBitboards=True, maxDepth=None, positions=POSITIONS):
+    results = []
+    for name, fen, expected, defaultDepth in positions:
+        depth = min(defaultDepth, maxDepth) if maxDepth else defaultDepth
+        gs = ChessEngine.GameState(useBitboards)
+        gs.loadFen(fen)
+        start = timeit.default_timer()
+        nodes = perft(gs, depth)
+        elapsed = timeit.default_timer() - start
+        results.append({'name': name, 'fen': fen, 'depth': depth, 'nodes': nodes,
+                        'expected': expected[depth - 1] if depth <= len(expected) else None,
+                        'time': round(elapsed, 4), 'nps': round(nodes / elapsed) if elapsed > 0 else 0})
+    return results
+
+
+'''
+Stampa i risultati e, se è presente una baseline, la variazione di nodi/secondo per posizione
+'''
+def printResults(results, baseline=None):
+    previous = {entry['name']: entry for entry in baseline['positions']} if baseline else {}
+    print('%-10s %5s %10s %9s %10s  %s' % ('position', 'depth', 'nodes', 'time', 'nodes/s', 'result'))
+    for entry in results:
+        if entry['expected'] is None:
+            outcome = '?'
+        else:
+            outcome = 'ok' if entry['nodes'] == entry['expected'] else 'FAIL (expected %d)' % entry['expected']
+        old = previous.get(entry['name'])
+        if old and old['depth'] == entry['depth'] and old['nps']:
+            outcome += '  %+.1f%% nodes/s' % (100 * (entry['nps'] / old['nps'] - 1))
+        print('%-10s %5d %10d %8.3fs %10d  %s' % (entry['name'], entry['depth'], entry['nodes'],
+                                                  entry['time'], entry['nps'], outcome))
+    totalNodes = sum(entry['nodes'] for entry in results)
+    totalTime = sum(entry['time'] for entry in results)
+    print('total: %d nodes in %.3fs (%d nodes/s)' % (totalNodes, totalTime, totalNodes / totalTime if totalTime else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft e divide per ChessEngine')
+    parser.add_argument('--mailbox', action='store_true', help='usa il GameState a matrice invece delle bitboard')
+    parser.add_argument('--depth', type=int, help='profondità massima per le posizioni della suite')
+    parser.add_argument('--divide', type=int, metavar='DEPTH', help='esegue divide sulla posizione --fen')
+    parser.add_argument('--fen', default=POSITIONS[0][1], help='posizione per --divide')
+    parser.add_argument('--output', help='salva i risultati in un file JSON (baseline)')
+    parser.add_argument('--baseline', help='file JSON con cui confrontare i risultati')
+    args = parser.parse_args()
+
+    if args.divide:
+        gs = ChessEngine.GameState(not args.mailbox)
+        gs.loadFen(args.fen)
+        counts = divide(gs, args.divide)
+        for notation in sorted(counts):
+            print(notation + ':', counts[notation])
+        print('total:', sum(counts.values()))
+        return
+
+    results = runSuite(not args.mailbox, args.depth)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    printResults(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'engine': 'mailbox' if args.mailbox else 'bitboards', 'python': platform.python_version(),
+                       'positions': results}, file, indent=2)
+    if any(entry['expected'] is not None and entry['nodes'] != entry['expected'] for entry in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark della ricerca di SmartMoveFinder (o di un'altra funzione di ricerca con la stessa firma di findBestMove).
+Esegue la ricerca a profondità fissa su una suite di posizioni di mediogioco e di finale e registra nodi,
+tempo per raggiungere ogni profondità, fattore di ramificazione e mossa scelta. Uso (dalla radice del repository):
+    python -m Chess.SearchBenchmark                                  # suite completa a profondità 4
+    python -m Chess.SearchBenchmark --output search.json             # salva i risultati come baseline JSON
+    python -m Chess.SearchBenchmark --baseline search.json           # confronta i risultati con la baseline
+    python -m Chess.SearchBenchmark --search modulo:funzione         # usa un'altra funzione di ricerca
+    python -m Chess.SearchBenchmark --workers 8                      # ricerca parallela con 8 processi
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib
+import io
+import json
+import platform
+import queue
+import random
+import sys
+import timeit
+from Chess import ChessEngine
+
+SEED = 20220318  # Seme per gli spareggi casuali dell'ordinamento delle mosse: le ricerche sono ripetibili
+
+# nome, FEN
+POSITIONS = [
+    # Mediogioco
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'),
+    ('italian', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10'),
+    ('qgd', 'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8'),
+    ('byrne-fischer', 'r2q1rk1/pp2ppbp/2p2np1/6B1/3PP1b1/Q1P2N2/P4PPP/3RKB1R b K - 0 13'),
+    ('scholar', 'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4'),
+    # Finale
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'),
+    ('kpk', '8/8/4k3/8/2KP4/8/8/8 w - - 0 1'),
+    ('rook-ending', '8/5pk1/6p1/8/3R4/6PP/5PK1/r7 w - - 0 1'),
+    ('back-rank', '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'),
+]
+
+
+'''
+Carica una funzione di ricerca indicata come "modulo:funzione"
+'''
+def loadSearch(name):
+    moduleName, functionName = name.split(':')
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+'''
+Esegue la ricerca su una posizione e ne raccoglie le statistiche.
+La funzione di ricerca riceve (gs, validMoves, returnQueue, maxDepth, timeLimit, nodeLimit, book, tablebaseDir)
+e mette la mossa nella coda; libro delle aperture e tablebase sono disattivati, così viene misurata sempre la
+ricerca. Se il suo modulo espone searchInfo (come SmartMoveFinder) vengono registrate anche le iterazioni.
+'''
+def benchmarkPosition(search, name, fen, depth, useBitboards=True):
+    module = sys.modules[getattr(search, 'func', search).__module__]  # search può essere un functools.partial
+    # Ogni posizione parte da una tabella vuota (anche nei processi della ricerca parallela)
+    if hasattr(module, 'clearTranspositionTable'):
+        module.clearTranspositionTable()
+    elif hasattr(module, 'transpositionTable'):
+        module.transpositionTable.clear()
+    random.seed(SEED)
+    gs = ChessEngine.GameState(useBitboards)
+    gs.loadFen(fen)
+    returnQueue = queue.Queue()
+    start = timeit.default_timer()
+    with contextlib.redirect_stdout(io.StringIO()):  # La ricerca stampa le proprie statistiche
+        search(gs, gs.getValidMoves(), returnQueue, maxDepth=depth, timeLimit=None, nodeLimit=None,
+               book=None, tablebaseDir=None)
+    elapsed = timeit.default_timer() - start
+    move = returnQueue.get()
+    result = {'name': name, 'fen': fen, 'depth': depth, 'move': move.getChessNotation() if move else None,
+              'time': round(elapsed, 4), 'nodes': None, 'nps': None, 'branchingFactor': None, 'iterations': []}
+
+    iterations = getattr(module, 'searchInfo', {}).get('iterations', [])
+    previousNodes = 0
+    for iteration in iterations:
+        result['iterations'].append({'depth': iteration['depth'], 'nodes': iteration['nodes'] - previousNodes,
+                                     'timeToDepth': round(iteration['time'], 4), 'score': iteration['score'],
+                                     'move': iteration['move']})
+        previousNodes = iteration['nodes']
+    if iterations:
+        last = iterations[-1]
+        result['nodes'] = last['nodes']
+        result['nps'] = round(last['nodes'] / elapsed) if elapsed > 0 else 0
+        for key in ('quiescenceNodes', 'betaCutoffs', 'evaluations'):
+            result[key] = last[key]
+        if len(result['iterations']) > 1 and result['iterations'][-2]['nodes']:
+            # Fattore di ramificazione effettivo: nodi dell'ultima iterazione rispetto alla precedente
+            result['branchingFactor'] = round(result['iterations'][-1]['nodes'] / result['iterations'][-2]['nodes'], 2)
+    return result
+
+
+def runSuite(search, depth, useBitboards=True, positions=POSITIONS):
+    return [benchmarkPosition(search, name, fen, depth, useBitboards) for name, fen in positions]
+
+
+'''
+Formatta la differenza percentuale rispetto alla baseline
+'''
+def relativeChange(new, old):
+    if new is None or not old:
+        return ''
+    return ' (%+.0f%%)' % (100 * (new / old - 1))
+
+
+'''
+Stampa i risultati e, se è presente una baseline, le differenze di mossa, nodi e tempo per posizione
+'''
+def printResults(results, baseline=None):
+    previous = {entry['name']: entry for entry in baseline['positions']} if baseline else {}
+    changedMoves = 0
+    print('%-14s %5s %6s %16s %16s %6s' % ('position', 'depth', 'move', 'nodes', 'time', 'ebf'))
+    for entry in results:
+        old = previous.get(entry['name'])
+        if old and old['depth'] != entry['depth']:
+            old = None
+        nodes = '-' if entry['nodes'] is None else str(entry['nodes'])
+        line = '%-14s %5d %6s %16s %16s %6s' % (
+            entry['name'], entry['depth'], entry['move'],
+            nodes + (relativeChange(entry['nodes'], old['nodes']) if old else ''),
+            '%.3fs' % entry['time'] + (relativeChange(entry['time'], old['time']) if old else ''),
+            '-' if entry['branchingFactor'] is None else entry['branchingFactor'])
+        if old and old['move'] != entry['move']:
+            line += '  move changed (was %s)' % old['move']
+            changedMoves += 1
+        print(line)
+    totalTime = sum(entry['time'] for entry in results)
+    totalNodes = sum(entry['nodes'] or 0 for entry in results)
+    summary = 'total: %d nodes in %.3fs' % (totalNodes, totalTime)
+    if previous:
+        oldTime = sum(entry['time'] for entry in baseline['positions'])
+        oldNodes = sum(entry['nodes'] or 0 for entry in baseline['positions'])
+        summary += ', baseline %d nodes in %.3fs, %d moves changed' % (oldNodes, oldTime, changedMoves)
+    print(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark della ricerca di SmartMoveFinder')
+    parser.add_argument('--depth', type=int, default=4, help='profondità fissa della ricerca')
+    parser.add_argument('--search', default='Chess.SmartMoveFinder:findBestMove',
+                        help='funzione di ricerca da misurare, come modulo:funzione')
+    parser.add_argument('--mailbox', action='store_true', help='usa il GameState a matrice invece delle bitboard')
+    parser.add_argument('--workers', type=int, help='processi della ricerca parallela (argomento workers)')
+    parser.add_argument('--output', help='salva i risultati in un file JSON (baseline)')
+    parser.add_argument('--baseline', help='file JSON con cui confrontare i risultati')
+    args = parser.parse_args()
+
+    search = loadSearch(args.search)
+    if args.workers:
+        search = functools.partial(search, workers=args.workers)
+    results = runSuite(search, args.depth, not args.mailbox)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    printResults(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'search': args.search, 'workers': args.workers, 'engine': 'mailbox' if args.mailbox else 'bitboards',
+                       'python': platform.python_version(), 'positions': results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
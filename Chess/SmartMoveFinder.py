@@ -1,69 +1,54 @@
+import os
 import random
+import time
 import timeit
-
-pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
-
-knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 1, 1, 1, 1, 1, 1, 1]]
-
-bishopScores = [[4, 3, 2, 1, 1, 2, 3, 4],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [4, 3, 2, 1, 1, 2, 3, 4]]
-
-queenScores = [[1, 1, 1, 3, 1, 1, 1, 1],
-               [1, 2, 3, 3, 2, 1, 1, 1],
-               [1, 4, 3, 3, 3, 4, 2, 1],
-               [1, 2, 3, 3, 3, 2, 2, 1],
-               [1, 2, 3, 3, 3, 2, 2, 1],
-               [1, 4, 3, 3, 3, 4, 2, 1],
-               [1, 1, 2, 3, 3, 1, 1, 1],
-               [1, 1, 1, 3, 1, 1, 1, 1]]
-
-rookScores = [[4, 3, 4, 4, 4, 4, 3, 4],
-              [4, 4, 4, 4, 4, 4, 4, 4],
-              [1, 1, 2, 3, 3, 2, 1, 1],
-              [1, 2, 3, 4, 4, 3, 2, 1],
-              [1, 2, 3, 4, 4, 3, 2, 1],
-              [1, 1, 2, 2, 2, 2, 1, 1],
-              [4, 4, 4, 4, 4, 4, 4, 4],
-              [4, 3, 4, 4, 4, 4, 3, 4]]
-
-whitePawnScores = [[8, 8, 8, 8, 8, 8, 8, 8],
-                   [8, 8, 8, 8, 8, 8, 8, 8],
-                   [5, 6, 6, 7, 7, 6, 6, 5],
-                   [2, 3, 3, 5, 5, 3, 3, 2],
-                   [1, 2, 3, 4, 4, 3, 2, 1],
-                   [1, 1, 2, 3, 3, 2, 1, 1],
-                   [1, 1, 1, 0, 0, 1, 1, 1],
-                   [0, 0, 0, 0, 0, 0, 0, 0]]
-
-blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
-                   [1, 1, 1, 0, 0, 1, 1, 1],
-                   [1, 1, 2, 3, 3, 2, 1, 1],
-                   [1, 2, 3, 4, 4, 3, 2, 1],
-                   [2, 3, 3, 5, 5, 3, 3, 2],
-                   [5, 6, 6, 7, 7, 6, 6, 5],
-                   [8, 8, 8, 8, 8, 8, 8, 8],
-                   [8, 8, 8, 8, 8, 8, 8, 8]]
-
-piecePositionScores = {"N": knightScores, "Q": queenScores, "B": bishopScores, "R": rookScores, "bp": blackPawnScores, "wp": whitePawnScores}
-
-
-
-CHECKMATE = 1000
-STALEMATE = 0
-DEPTH = 2
+from multiprocessing import Pool
+from Chess.TranspositionTable import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from Chess import OpeningBook, Tablebase
+from Chess.ScoreTables import pieceScore, piecePositionScores, CHECKMATE, STALEMATE, MATE_PLIES
+
+DEPTH = 6  # Profondità massima dell'approfondimento iterativo
+TIME_LIMIT = 3.0  # Secondi a disposizione per ogni mossa (None = nessun limite)
+NODE_LIMIT = None  # Nodi a disposizione per ogni mossa (None = nessun limite)
+DELTA_MARGIN = 2  # Margine della delta pruning nella ricerca quiescente
+TT_SIZE_MB = 16  # Memoria riservata alla tabella delle trasposizioni
+WORKERS = 1  # Processi usati da findBestMove (1 = ricerca sequenziale nel processo corrente)
+SEED = None  # Seme per gli spareggi casuali dell'ordinamento: con un seme fisso la ricerca è ripetibile
+BOOK_FILE = OpeningBook.BOOK_FILE  # Libro delle aperture consultato prima di cercare (None = nessun libro)
+TABLEBASE_DIR = Tablebase.TABLEBASE_DIR  # Cartella delle tablebase dei finali (None = nessuna tablebase)
+
+# La tabella resta in memoria tra una chiamata e l'altra di findBestMove (mosse della stessa partita)
+transpositionTable = TranspositionTable(TT_SIZE_MB)
+
+# Stato della ricerca in corso
+rootDepth = DEPTH  # Profondità dell'iterazione corrente
+nodes = 0  # Nodi visitati dalla ricerca corrente (compresi quelli della ricerca quiescente)
+quiescenceNodes = 0  # Nodi visitati dalla ricerca quiescente
+betaCutoffs = 0  # Potature beta della ricerca principale
+evaluations = 0  # Valutazioni statiche della scacchiera
+searchDeadline = None
+searchNodeLimit = None
+searchAborted = False  # Diventa True quando il tempo o i nodi a disposizione finiscono
+principalVariation = []  # moveID della variante principale dell'ultima iterazione completata
+killerMoves = []  # Per ogni ply, i moveID delle ultime due mosse tranquille che hanno causato una potatura
+# Per ogni pezzo e casa di arrivo, quanto spesso quella mossa tranquilla ha causato una potatura
+historyTable = {color + piece: [0] * 64 for color in 'wb' for piece in 'pRNBQK'}
+# Statistiche dell'ultima ricerca di findBestMove (usate da SearchBenchmark): per ogni iterazione completata
+# profondità, nodi, tempo trascorso dall'inizio, punteggio e mossa migliore
+searchInfo = {'iterations': []}
+# Pool di processi della ricerca parallela, creata alla prima ricerca con più processi e poi riutilizzata
+searchPool = None
+searchPoolSize = 0
+# Ricerche parallele avviate e svuotamenti della tabella: i compiti li riportano, così ogni processo della pool
+# invecchia la propria tabella una volta per ricerca e la svuota quando lo fa il processo principale
+parallelSearchId = 0
+tableGeneration = 0
+openingBook = None  # Libro aperto (mappato in memoria) al primo uso, se il file esiste
+openingBookPath = None
+tablebases = None  # Tablebase aperte (mappate in memoria) al primo uso, se la cartella ne contiene
+tablebasesPath = None
+# Funzione senza argomenti che ritorna True quando la ricerca va annullata (usata da EngineWorker), oppure None
+stopSearch = None
 
 '''
 Ritorna una mossa del tutto casuale
@@ -105,20 +90,466 @@ def findBestMove(gs, validMoves):
 '''
 
 '''
-Ritorna la mossa migliore in base al materiale (Algoritmo Minimax ricorsivo)
+Ritorna la mossa migliore (Algoritmo NegaMax con potatura alpha-beta e approfondimento iterativo).
+Cerca a profondità 1, 2, ... fino a maxDepth, finché restano tempo (secondi) e nodi a disposizione,
+e ritorna la mossa dell'ultima iterazione completata. Ogni iterazione prova per prima la variante
+principale di quella precedente. Se la posizione è nel libro delle aperture book la mossa viene presa
+dal libro senza cercare; nei finali coperti dalle tablebase della cartella tablebaseDir la mossa viene
+presa dalle tabelle (book o tablebaseDir None le disattivano). Con workers > 1 la ricerca viene divisa
+tra più processi (vedi findBestMoveParallel); con un seme fisso e un solo processo il risultato è ripetibile.
 '''
 
 
-def findBestMove(gs, validMoves, returnQueue):
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)
+def findBestMove(gs, validMoves, returnQueue, maxDepth=DEPTH, timeLimit=TIME_LIMIT, nodeLimit=NODE_LIMIT,
+                 workers=WORKERS, seed=SEED, book=BOOK_FILE, tablebaseDir=TABLEBASE_DIR):
+    global nextMove, rootDepth, principalVariation, searchInfo
     # findMoveMiniMax(gs, validMoves, DEPTH, gs.whiteToMove)
+    if seed is not None:
+        random.seed(seed)
+    bookMove = findBookMove(gs, validMoves, book)
+    if bookMove is not None:
+        principalVariation = [bookMove.moveID]
+        searchInfo = {'iterations': []}
+        returnQueue.put(bookMove)
+        return
+    loadTablebases(tablebaseDir)
+    tablebaseMove = findTablebaseMove(gs, validMoves)
+    if tablebaseMove is not None:
+        principalVariation = [tablebaseMove.moveID]
+        searchInfo = {'iterations': []}
+        returnQueue.put(tablebaseMove)
+        return
+    if workers > 1 and len(validMoves) > 1:
+        returnQueue.put(findBestMoveParallel(gs, validMoves, maxDepth, timeLimit, nodeLimit, workers, seed,
+                                             tablebaseDir))
+        return
     start = timeit.default_timer()
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+    transpositionTable.newSearch()
+    resetSearchState(maxDepth, timeLimit, nodeLimit)
+    searchInfo = {'iterations': []}
+    bestMove = None
+    completedDepth = 0
+    for depth in range(1, maxDepth + 1):
+        rootDepth = depth
+        nextMove = None
+        score = findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+        if searchAborted:  # Iterazione incompleta: si tiene la mossa della precedente
+            break
+        if nextMove is not None:
+            bestMove = nextMove
+        completedDepth = depth
+        principalVariation = getPrincipalVariation(gs, depth)
+        searchInfo['iterations'].append({'depth': depth, 'nodes': nodes, 'quiescenceNodes': quiescenceNodes,
+                                         'betaCutoffs': betaCutoffs, 'evaluations': evaluations,
+                                         'time': timeit.default_timer() - start, 'score': score,
+                                         'move': bestMove.getChessNotation() if bestMove is not None else None})
+        if searchDeadline is not None and timeit.default_timer() >= searchDeadline:
+            break
     stop = timeit.default_timer()
-    print('Time: ', stop - start)
-    returnQueue.put(nextMove)
+    print('Time: ', stop - start, 'Depth: ', completedDepth, 'Nodes: ', nodes, 'Quiescence nodes: ', quiescenceNodes)
+    returnQueue.put(bestMove)
+
+
+'''
+Mossa del libro delle aperture book (percorso del file) per la posizione di gs, oppure None.
+Il libro viene aperto una volta sola e resta mappato in memoria per le mosse successive.
+'''
+
+
+def findBookMove(gs, validMoves, book):
+    global openingBook, openingBookPath
+    if book is None:
+        return None
+    if openingBookPath != book:
+        if openingBook is not None:
+            openingBook.close()
+        openingBook = OpeningBook.OpeningBook(book) if os.path.isfile(book) else None
+        openingBookPath = book
+    if openingBook is None:
+        return None
+    return openingBook.findMove(gs.zobristHash, validMoves)
+
+
+'''
+Apre le tablebase della cartella directory, se non sono già aperte (resta None se non ci sono tabelle)
+'''
+
+
+def loadTablebases(directory):
+    global tablebases, tablebasesPath
+    if tablebasesPath != directory:
+        if tablebases is not None:
+            tablebases.close()
+        tablebases = Tablebase.Tablebases(directory) if directory is not None else None
+        if tablebases is not None and not tablebases.tables:
+            tablebases = None
+        tablebasesPath = directory
+
+
+'''
+Punteggio della posizione di gs secondo le tablebase (come scoreBoard: positivo se vince il bianco; una vittoria
+più vicina al matto vale di più), oppure None se la posizione non è nelle tabelle.
+ply è la distanza di gs dalla radice della ricerca, così il matto ha lo stesso valore che gli darebbe la ricerca.
+'''
+
+
+def tablebaseScore(gs, ply=0):
+    entry = tablebases.probe(gs)
+    if entry is None:
+        return None
+    result, dtm = entry
+    return result * (CHECKMATE - ply - dtm)
+
+
+'''
+Un matto vale CHECKMATE - ply, dove ply è la sua distanza dalla radice: nella tabella delle trasposizioni viene
+salvato come distanza dalla posizione stessa (scoreToTable), così resta valido quando la posizione viene
+raggiunta a un'altra distanza dalla radice (scoreFromTable)
+'''
+
+
+def scoreToTable(score, ply):
+    if score >= CHECKMATE - MATE_PLIES:
+        return score + ply
+    if score <= MATE_PLIES - CHECKMATE:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= CHECKMATE - MATE_PLIES:
+        return score - ply
+    if score <= MATE_PLIES - CHECKMATE:
+        return score + ply
+    return score
+
+
+'''
+Se la posizione è nelle tablebase ritorna la mossa che porta più in fretta al matto (o che lo ritarda di più
+quando la posizione è persa), altrimenti None
+'''
+
+
+def findTablebaseMove(gs, validMoves):
+    if tablebases is None or gs.pieceCount() > Tablebase.MAX_PIECES:
+        return None
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    bestMove = None
+    maxScore = -CHECKMATE - 1
+    for move in validMoves:
+        gs.makeMove(move)
+        score = tablebaseScore(gs)
+        gs.undoMove()
+        if score is None:
+            return None
+        if turnMultiplier * score > maxScore:
+            maxScore = turnMultiplier * score
+            bestMove = move
+    return bestMove
+
+
+'''
+Svuota la tabella delle trasposizioni (nuova partita); i processi della pool svuotano la propria
+al primo compito successivo
+'''
+
+
+def clearTranspositionTable():
+    global tableGeneration
+    transpositionTable.clear()
+    tableGeneration += 1
+
+
+'''
+Azzera lo stato della ricerca (contatori, limiti, mosse killer e storia) prima di una nuova ricerca
+'''
+
+
+def resetSearchState(maxDepth, timeLimit, nodeLimit):
+    global nodes, searchDeadline, searchNodeLimit, searchAborted, principalVariation
+    global killerMoves, historyTable, quiescenceNodes, betaCutoffs, evaluations
+    nodes = 0
+    quiescenceNodes = 0
+    betaCutoffs = 0
+    evaluations = 0
+    searchDeadline = timeit.default_timer() + timeLimit if timeLimit is not None else None
+    searchNodeLimit = nodeLimit
+    searchAborted = False
+    principalVariation = []
+    killerMoves = [[0, 0] for _ in range(maxDepth + 1)]
+    historyTable = {color + piece: [0] * 64 for color in 'wb' for piece in 'pRNBQK'}
+
+
+'''
+Ricerca parallela con suddivisione della radice. A ogni iterazione la mossa migliore della precedente
+viene cercata per prima con finestra piena; il suo punteggio diventa alpha per tutte le altre mosse,
+distribuite tra i processi della pool. Ogni processo ha la propria tabella delle trasposizioni, che resta
+in memoria tra un compito e l'altro. I nodi vengono contati qui, così l'intera ricerca resta entro nodeLimit:
+la prima mossa può usare tutti quelli ancora a disposizione, le altre se li dividono in parti uguali.
+Dopo ogni iterazione la variante principale è quella ricostruita dal processo che ha cercato la mossa migliore.
+'''
+
+
+def findBestMoveParallel(gs, validMoves, maxDepth, timeLimit, nodeLimit, workers, seed, tablebaseDir):
+    global searchInfo, principalVariation, parallelSearchId
+    start = timeit.default_timer()
+    # Scadenza in tempo assoluto (time.time), confrontabile tra processi diversi
+    deadline = time.time() + timeLimit if timeLimit is not None else None
+    pool = getSearchPool(workers)
+    parallelSearchId += 1
+    fen = gs.getFen()
+    resetSearchState(maxDepth, timeLimit, nodeLimit)
+    rootMoves = list(validMoves)
+    orderMoves(rootMoves, 0, None)  # Catture prima, poi ordine casuale
+    searchInfo = {'iterations': []}
+    totalNodes = 0
+    bestMove = None
+    completedDepth = 0
+    for depth in range(1, maxDepth + 1):
+        def task(move, alpha, moves):
+            # Parte dei nodi rimasti per ognuna delle moves mosse cercate insieme
+            moveNodeLimit = max(0, nodeLimit - totalNodes) // moves if nodeLimit is not None else None
+            return (type(gs), fen, move.moveID, depth, alpha, deadline, moveNodeLimit, seed, tablebaseDir,
+                    parallelSearchId, tableGeneration)
+
+        firstScore, firstNodes, aborted, firstPV = pool.apply(searchRootMove,
+                                                              (task(rootMoves[0], -CHECKMATE, 1),))
+        totalNodes += firstNodes
+        if aborted:  # Iterazione incompleta: si tiene la mossa della precedente
+            break
+        results = pool.map(searchRootMove, [task(move, firstScore, len(rootMoves) - 1) for move in rootMoves[1:]],
+                           chunksize=1)
+        totalNodes += sum(result[1] for result in results)
+        if any(result[2] for result in results):
+            break
+        scores = [firstScore] + [result[0] for result in results]
+        pvs = [firstPV] + [result[3] for result in results]
+        # Ordinamento stabile: a parità di punteggio resta davanti la mossa già cercata per prima
+        order = sorted(range(len(rootMoves)), key=lambda i: scores[i], reverse=True)
+        rootMoves = [rootMoves[i] for i in order]
+        bestMove = rootMoves[0]
+        principalVariation = pvs[order[0]]
+        completedDepth = depth
+        searchInfo['iterations'].append({'depth': depth, 'nodes': totalNodes, 'quiescenceNodes': None,
+                                         'betaCutoffs': None, 'evaluations': None,
+                                         'time': timeit.default_timer() - start, 'score': scores[order[0]],
+                                         'move': bestMove.getChessNotation()})
+        if deadline is not None and time.time() >= deadline:
+            break
+    stop = timeit.default_timer()
+    print('Time: ', stop - start, 'Depth: ', completedDepth, 'Nodes: ', totalNodes, 'Workers: ', workers)
+    return bestMove
+
+
+'''
+Compito di un processo della pool: cerca una mossa della radice e ritorna (punteggio, nodi, interrotta,
+variante principale a partire dalla mossa). Le mosse che non superano alpha ritornano solo un limite superiore,
+che basta per scartarle.
+'''
+
+
+def searchRootMove(task):
+    global rootDepth, parallelSearchId, tableGeneration
+    gsClass, fen, moveID, depth, alpha, deadline, nodeLimit, seed, tablebaseDir, searchId, generation = task
+    if generation != tableGeneration:  # Il processo principale ha svuotato la tabella
+        transpositionTable.clear()
+        tableGeneration = generation
+    if searchId != parallelSearchId:  # Primo compito di questo processo per una nuova ricerca
+        transpositionTable.newSearch()
+        parallelSearchId = searchId
+    gs = gsClass()
+    gs.loadFen(fen)
+    loadTablebases(tablebaseDir)
+    move = findValidMove(gs, moveID)
+    if seed is not None:
+        random.seed(seed * 1000003 + depth * 131072 + moveID)
+    resetSearchState(depth, max(0.0, deadline - time.time()) if deadline is not None else None, nodeLimit)
+    rootDepth = depth
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    gs.makeMove(move)
+    score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -CHECKMATE, -alpha, -turnMultiplier)
+    pv = [moveID] + getPrincipalVariation(gs, depth - 1) if not searchAborted else []
+    return score, nodes, searchAborted, pv
+
+
+'''
+Ritorna la pool di processi della ricerca parallela, creandola (o ricreandola) con workers processi
+'''
+
+
+def getSearchPool(workers):
+    global searchPool, searchPoolSize
+    if searchPool is None or searchPoolSize != workers:
+        if searchPool is not None:
+            searchPool.terminate()
+        searchPool = Pool(workers)
+        searchPoolSize = workers
+    return searchPool
+
+
+'''
+Verifica se la ricerca ha esaurito il tempo o i nodi a disposizione, oppure se è stata annullata.
+La prima iterazione viene sempre completata, così c'è sempre una mossa da giocare (tranne se annullata).
+'''
+
+
+def outOfBudget():
+    global searchAborted
+    if stopSearch is not None and not searchAborted and nodes & 255 == 0 and stopSearch():
+        searchAborted = True
+    if rootDepth > 1 and not searchAborted:
+        if searchNodeLimit is not None and nodes >= searchNodeLimit:
+            searchAborted = True
+        elif searchDeadline is not None and nodes & 255 == 0 and timeit.default_timer() >= searchDeadline:
+            searchAborted = True
+    return searchAborted
+
+
+'''
+Ricostruisce la variante principale seguendo le mosse migliori salvate nella tabella delle trasposizioni
+'''
+
+
+def getPrincipalVariation(gs, depth):
+    pv = []
+    for _ in range(depth):
+        entry = transpositionTable.probe(gs.zobristHash)
+        if entry is None:
+            break
+        move = None
+        for validMove in gs.getValidMoves():
+            if validMove.moveID == entry[3]:
+                move = validMove
+                break
+        if move is None:
+            break
+        gs.makeMove(move)
+        pv.append(move.moveID)
+    for _ in pv:
+        gs.undoMove()
+    return pv
+
+
+'''
+Ordina le mosse per rendere più frequenti le potature alpha-beta:
+1.) la mossa della variante principale dell'iterazione precedente e quella della tabella delle trasposizioni
+2.) le catture, dalla vittima di valore più alto con l'attaccante di valore più basso (MVV-LVA), e le promozioni
+3.) le mosse killer di questo ply
+4.) le altre mosse tranquille secondo la tabella della storia
+A parità di punteggio l'ordine è casuale, così il gioco non diventa ripetitivo.
+'''
+
+
+def orderMoves(validMoves, ply, hashMoveID):
+    pvMoveID = principalVariation[ply] if ply < len(principalVariation) else None
+    killers = killerMoves[ply] if ply < len(killerMoves) else (0, 0)
+
+    def moveOrderScore(move):
+        moveID = move.moveID
+        if moveID == pvMoveID:
+            score = 4000000
+        elif moveID == hashMoveID:
+            score = 3000000
+        elif move.pieceCaptured != '--' or move.isPawnPromotion:
+            score = 2000000 + mvvLvaScore(move)
+        elif moveID == killers[0]:
+            score = 1000001
+        elif moveID == killers[1]:
+            score = 1000000
+        else:
+            score = historyTable[move.pieceMoved][(moveID >> 6) & 63]
+        return score + random.random()
+
+    validMoves.sort(key=moveOrderScore, reverse=True)
+
+
+'''
+Generatore a fasi delle mosse di un nodo interno, nello stesso ordine di orderMoves:
+1.) mossa della variante principale e mossa della tabella delle trasposizioni (verificate generando
+    solo le mosse del pezzo che le gioca)
+2.) catture e promozioni a Regina (MVV-LVA)
+3.) mosse killer, verificate come al punto 1
+4.) le mosse tranquille e le sottopromozioni, secondo la tabella della storia
+Ogni fase viene generata solo quando serve: se una mossa causa una potatura le fasi successive non
+vengono mai generate. Scacchi e inchiodature vengono calcolati una volta sola e passati a tutte le fasi.
+Se il nodo non ha mosse legali, l'ultima fase aggiorna checkMate e staleMate.
+'''
+
+
+def stagedMoves(gs, ply, hashMoveID):
+    pinsAndChecks = gs.checkForPinsAndChecks()
+    tried = set()  # moveID già prodotti
+    pvMoveID = principalVariation[ply] if ply < len(principalVariation) else 0
+    for moveID in (pvMoveID, hashMoveID):
+        if moveID and moveID not in tried:
+            move = findValidMove(gs, moveID, pinsAndChecks)
+            if move is not None:
+                tried.add(moveID)
+                yield move
+
+    captures = gs.getValidCaptures(pinsAndChecks)
+    captures.sort(key=lambda move: mvvLvaScore(move) + random.random(), reverse=True)
+    for move in captures:
+        if move.moveID not in tried:
+            tried.add(move.moveID)
+            yield move
+
+    for moveID in (killerMoves[ply] if ply < len(killerMoves) else ()):
+        if moveID and moveID not in tried:
+            move = findValidMove(gs, moveID, pinsAndChecks)
+            if move is not None:
+                tried.add(moveID)
+                yield move
+
+    quietMoves = [move for move in gs.getValidQuietMoves(pinsAndChecks) if move.moveID not in tried]
+    if not tried and not quietMoves:  # Nessuna mossa legale: scaccomatto o stallo
+        gs.updateGameOver(False, pinsAndChecks[0])
+    quietMoves.sort(key=lambda move: historyTable[move.pieceMoved][(move.moveID >> 6) & 63] + random.random(),
+                    reverse=True)
+    yield from quietMoves
+
+
+'''
+Ritorna la mossa legale con il moveID dato, oppure None (la mossa può venire da un'altra posizione)
+'''
+
+
+def findValidMove(gs, moveID, pinsAndChecks=None):
+    for move in gs.getValidMovesFrom((moveID >> 3) & 7, moveID & 7, pinsAndChecks):
+        if move.moveID == moveID:
+            return move
+    return None
+
+
+'''
+Punteggio MVV-LVA di una cattura (o promozione): prima la vittima di valore più alto,
+poi l'attaccante di valore più basso
+'''
+
+
+def mvvLvaScore(move):
+    score = -pieceScore[move.pieceMoved[1]]
+    if move.pieceCaptured != '--':
+        score += 10 * pieceScore[move.pieceCaptured[1]]
+    if move.isPawnPromotion:
+        score += 10 * pieceScore[move.promotionPiece[1]]
+    return score
+
+
+'''
+Una mossa tranquilla che ha causato una potatura diventa killer per il suo ply e guadagna punti nella storia
+'''
+
+
+def recordCutoff(move, ply, depth):
+    if move.pieceCaptured != '--' or move.isPawnPromotion:
+        return
+    if ply < len(killerMoves):
+        killers = killerMoves[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+    historyTable[move.pieceMoved][(move.moveID >> 6) & 63] += depth * depth
 
 
 def findMoveMiniMax(gs, validMoves, depth, whiteToMove):
@@ -172,27 +603,140 @@ def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
 
 
 def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-
-    maxScore = -CHECKMATE
+    global nextMove, nodes, betaCutoffs
+    nodes += 1
+    if outOfBudget():
+        return 0
+    ply = rootDepth - depth
+    if tablebases is not None and validMoves is None and gs.pieceCount() <= Tablebase.MAX_PIECES:
+        score = tablebaseScore(gs, ply)  # Finale nelle tablebase: il valore esatto, senza cercare
+        if score is not None:
+            return turnMultiplier * score
+    if depth == 0:  # All'orizzonte si continua finché la posizione non è tranquilla
+        return quiescenceSearch(gs, alpha, beta, turnMultiplier, ply)
+    if validMoves is not None and len(validMoves) == 0:  # Scaccomatto o stallo alla radice
+        return -CHECKMATE if gs.checkMate else STALEMATE
+    # Da qui al massimo si dà matto alla prossima mossa e al minimo si subisce matto subito: se la finestra è già
+    # fuori da questi limiti (è stato trovato un matto più vicino) il nodo non può cambiare nulla
+    alpha = max(alpha, ply - CHECKMATE)
+    beta = min(beta, CHECKMATE - ply - 1)
+    if alpha >= beta:
+        return alpha
+
+    # Tabella delle trasposizioni: la posizione potrebbe essere già stata valutata abbastanza a fondo
+    key = gs.zobristHash
+    alphaOrig = alpha
+    entry = transpositionTable.probe(key)
+    hashMoveID = None
+    if entry is not None:
+        entryDepth, entryScore, entryBound, hashMoveID = entry
+        entryScore = scoreFromTable(entryScore, ply)
+        if entryDepth >= depth and depth != rootDepth:  # Alla radice serve comunque nextMove
+            if entryBound == EXACT:
+                return entryScore
+            elif entryBound == LOWERBOUND:
+                alpha = max(alpha, entryScore)
+            elif entryBound == UPPERBOUND:
+                beta = min(beta, entryScore)
+            if alpha >= beta:
+                return entryScore
+    if validMoves is not None:  # Alla radice la lista delle mosse è già pronta
+        orderMoves(validMoves, ply, hashMoveID)
+    else:  # Nei nodi interni le mosse vengono generate a fasi
+        validMoves = stagedMoves(gs, ply, hashMoveID)
+
+    maxScore = -CHECKMATE - 1  # Anche in una posizione persa (tutte le mosse a -CHECKMATE) una mossa viene scelta
+    bestMove = None
+    movesSearched = 0
     for move in validMoves:
+        movesSearched += 1
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
+        score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier)
+        gs.undoMove()
+        if searchAborted:  # Il risultato di una ricerca interrotta non è affidabile
+            return 0
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
+            bestMove = move
+            if depth == rootDepth:
                 nextMove = move
-        gs.undoMove()
         if maxScore > alpha:  # Potatura
             alpha = maxScore
         if alpha >= beta:
+            betaCutoffs += 1
+            recordCutoff(move, ply, depth)
             break
+
+    if movesSearched == 0:  # Nessuna mossa legale: scaccomatto o stallo (aggiornati dall'ultima fase)
+        return -(CHECKMATE - ply) if gs.checkMate else STALEMATE
+    if maxScore <= alphaOrig:
+        bound = UPPERBOUND
+    elif maxScore >= beta:
+        bound = LOWERBOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(key, depth, scoreToTable(maxScore, ply), bound,
+                             bestMove.moveID if bestMove is not None else 0)
     return maxScore
 
 
+'''
+Ricerca quiescente: all'orizzonte esplora solo catture e promozioni, finché la posizione non è tranquilla,
+così la valutazione non viene fatta a metà di uno scambio.
+Il giocatore può sempre "stare fermo" (stand pat) e tenersi la valutazione statica, tranne quando è sotto
+scacco: in quel caso vengono esaminate tutte le mosse che parano lo scacco.
+Le catture che, anche guadagnando il pezzo catturato, non riportano il punteggio sopra alpha
+vengono scartate (delta pruning). ply è la distanza dalla radice, per il punteggio dei matti.
+'''
+
+
+def quiescenceSearch(gs, alpha, beta, turnMultiplier, ply):
+    global nodes, quiescenceNodes, evaluations
+    nodes += 1
+    quiescenceNodes += 1
+    if outOfBudget():
+        return 0
+    if tablebases is not None and gs.pieceCount() <= Tablebase.MAX_PIECES:
+        score = tablebaseScore(gs, ply)
+        if score is not None:
+            return turnMultiplier * score
+
+    inCheck = gs.inCheck()
+    if inCheck:
+        moves = gs.getValidMoves()
+        if len(moves) == 0:  # Scaccomatto
+            return -(CHECKMATE - ply)
+        standPat = bestScore = -CHECKMATE
+    else:
+        evaluations += 1
+        standPat = bestScore = turnMultiplier * scoreBoard(gs)
+        if standPat >= beta:
+            return standPat
+        if standPat + pieceScore['Q'] + DELTA_MARGIN < alpha:  # Nemmeno catturare una regina basterebbe
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        moves = gs.getValidCaptures()
+    moves.sort(key=mvvLvaScore, reverse=True)
+
+    for move in moves:
+        if not inCheck and not move.isPawnPromotion \
+                and standPat + pieceScore[move.pieceCaptured[1]] + DELTA_MARGIN < alpha:  # Delta pruning
+            continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMultiplier, ply + 1)
+        gs.undoMove()
+        if searchAborted:
+            return 0
+        if score > bestScore:
+            bestScore = score
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            break
+    return bestScore
+
+
 '''
 Un punteggio positivo è ottimo per il bianco, se negativo è ottimo per il nero
 '''
@@ -207,24 +751,9 @@ def scoreBoard(gs):
     elif gs.staleMate:
         return STALEMATE
 
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            # Gioco a somma zero: il vantaggio del bianco è svantaggio per nero
-            square = gs.board[row][col]
-            if square != "--":  # Punteggio in base alla posizione
-                piecePositionScore = 0
-                if square[1] != "K":  # Non ci sono punteggi per la posizione del re
-                    if square[1] == 'p':  # Per pedoni
-                        piecePositionScore = piecePositionScores[square][row][col]
-                    else:  # Per altri pezzi
-                        piecePositionScore = piecePositionScores[square[1]][row][col]
-
-                if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .1
-                elif square[0] == 'b':
-                    score -= pieceScore[square[1]] + piecePositionScore * .1
-    return score
+    # Materiale e posizione vengono aggiornati da GameState a ogni mossa: niente scansione della scacchiera
+    # Gioco a somma zero: il vantaggio del bianco è svantaggio per nero
+    return gs.materialScore + gs.positionScore * .1
 
 
 '''
@@ -0,0 +1,309 @@
+"""
+Tablebase dei finali con tre pezzi: re e donna, re e torre, re e pedone contro re solo (KQK, KRK, KPK).
+Le tabelle vengono calcolate con l'analisi retrograda: si parte dalle posizioni di scaccomatto e si torna
+indietro una semimossa alla volta, così ogni posizione vinta riceve la distanza dal matto (DTM) con il
+gioco migliore di entrambi. Ogni file ha un byte per posizione, prima le posizioni con il tratto al
+giocatore più forte e poi quelle con il tratto al re solo: 0 indica patta (o posizione impossibile),
+n > 0 vittoria del giocatore più forte con matto in n - 1 semimosse. I file vengono letti tramite mmap,
+quindi la consultazione durante la ricerca non richiede di caricarli. Uso (dalla radice del repository):
+    python -m Chess.Tablebase --generate                   # scrive KQK.bin, KRK.bin e KPK.bin in Chess/tablebases
+    python -m Chess.Tablebase --verify 2000                # confronta le tabelle con le mosse legali di GameState
+    python -m Chess.Tablebase --fen "8/8/8/4k3/8/8/8/KQ6 w - - 0 1"
+"""
+
+import argparse
+import collections
+import mmap
+import os
+import random
+import timeit
+from Chess import ChessEngine
+from Chess.BitboardEngine import ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_ATTACKS, PAWN_ATTACKS, RAYS, BETWEEN, \
+    slidingAttacks, squaresOf
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+MAX_PIECES = 3  # Numero massimo di pezzi (re compresi) delle posizioni presenti nelle tabelle
+# Materiale del giocatore più forte oltre al re (come nelle stringhe della scacchiera) e nome del file.
+# KPK viene dopo KQK e KRK perché la promozione porta in quelle tabelle.
+MATERIALS = {'Q': 'KQK', 'R': 'KRK', 'p': 'KPK'}
+PROMOTIONS = ('Q', 'R')  # Promozioni considerate in KPK (alfiere e cavallo portano a finali patti)
+TABLE_SIZE = 64 * 64 * 64  # Indice: re forte << 12 | re solo << 6 | pezzo, con la casa sq = r * 8 + c
+# Case raggiungibili dal re da ogni casa, come lista e come bitboard
+KING_STEPS = [sorted(squaresOf(mask)) for mask in KING_ATTACKS]
+KING_MASKS = KING_ATTACKS
+# Direzioni in cui scorre ogni pezzo (il pedone non scorre)
+DIRECTIONS = {'Q': ROOK_DIRECTIONS + BISHOP_DIRECTIONS, 'R': ROOK_DIRECTIONS, 'p': ()}
+# Case attaccate da ogni pezzo su una scacchiera vuota (il pedone bianco cattura verso la riga 0)
+ATTACK_MASKS = {piece: [sum(RAYS[d][sq] for d in DIRECTIONS[piece]) for sq in range(64)] for piece in 'QR'}
+ATTACK_MASKS['p'] = PAWN_ATTACKS['w']
+
+
+'''
+Verifica se il pezzo bianco piece sulla casa sq attacca la casa target, con il re bianco su king
+come unico possibile ostacolo (il re nero, che è quello attaccato, non blocca)
+'''
+def attacks(piece, sq, target, king):
+    return ATTACK_MASKS[piece][sq] >> target & 1 and not BETWEEN[sq][target] >> king & 1
+
+
+'''
+Case da cui il pezzo bianco piece può essere arrivato su sq (mossa all'indietro) con i re su whiteKing e blackKing
+'''
+def unmoves(piece, sq, whiteKing, blackKing):
+    if piece == 'p':
+        previous = []
+        if sq + 8 < 56 and sq + 8 != whiteKing and sq + 8 != blackKing:
+            previous.append(sq + 8)
+            if 32 <= sq < 40 and sq + 16 != whiteKing and sq + 16 != blackKing:  # Spinta di due case dalla riga 6
+                previous.append(sq + 16)
+        return previous
+    kings = 1 << whiteKing | 1 << blackKing
+    return squaresOf(slidingAttacks(sq, kings, DIRECTIONS[piece]) & ~kings)
+
+
+'''
+Calcola la tabella del materiale re + piece contro re. Ritorna due bytearray di TABLE_SIZE byte (tratto al bianco,
+tratto al nero) nel formato dei file. promotionTables sono le tabelle (solo quelle con il tratto al nero) in cui
+porta la promozione del pedone.
+'''
+def generateTable(piece, promotionTables=()):
+    white = bytearray(TABLE_SIZE)
+    black = bytearray(TABLE_SIZE)
+    counts = bytearray(TABLE_SIZE)  # Mosse del nero non ancora dimostrate perdenti
+    frontier = []
+    seeds = collections.defaultdict(list)  # Vittorie del bianco per promozione, raggruppate per DTM
+    for whiteKing in range(64):
+        for blackKing in range(64):
+            if blackKing == whiteKing or KING_MASKS[whiteKing] >> blackKing & 1:
+                continue
+            for sq in range(64):
+                if sq == whiteKing or sq == blackKing or (piece == 'p' and not 8 <= sq < 56):
+                    continue
+                index = whiteKing << 12 | blackKing << 6 | sq
+                # Tratto al nero: mosse legali del re solo
+                moves = 0
+                canCapture = False
+                for step in KING_STEPS[blackKing]:
+                    if step == sq:
+                        canCapture = canCapture or not KING_MASKS[whiteKing] >> sq & 1
+                    elif step != whiteKing and not KING_MASKS[whiteKing] >> step & 1 \
+                            and not attacks(piece, sq, step, whiteKing):
+                        moves += 1
+                inCheck = attacks(piece, sq, blackKing, whiteKing)
+                if canCapture:  # Catturando l'ultimo pezzo il nero ottiene la patta
+                    pass
+                elif moves:
+                    counts[index] = moves
+                elif inCheck:  # Scaccomatto
+                    black[index] = 1
+                    frontier.append(index)
+                # Tratto al bianco: le promozioni escono dalla tabella, quindi il loro esito viene dalle altre tabelle
+                if piece == 'p' and sq < 16 and not inCheck and sq - 8 != whiteKing and sq - 8 != blackKing:
+                    results = [table[whiteKing << 12 | blackKing << 6 | sq - 8] for table in promotionTables]
+                    results = [result for result in results if result]
+                    if results:
+                        seeds[min(results)].append(index)  # Matto in min(results) - 1 + 1 semimosse
+
+    ply = 0
+    while frontier or any(level > ply for level in seeds):
+        nextFrontier = []
+        if ply % 2 == 0:
+            # frontier: posizioni perse dal nero in ply semimosse. Le mosse del bianco che ci portano vincono.
+            for index in frontier:
+                whiteKing, blackKing, sq = index >> 12, index >> 6 & 63, index & 63
+                for previous in KING_STEPS[whiteKing]:
+                    if previous == sq or previous == blackKing or KING_MASKS[previous] >> blackKing & 1 \
+                            or attacks(piece, sq, blackKing, previous):
+                        continue
+                    previousIndex = previous << 12 | blackKing << 6 | sq
+                    if not white[previousIndex]:
+                        white[previousIndex] = ply + 2
+                        nextFrontier.append(previousIndex)
+                for previous in unmoves(piece, sq, whiteKing, blackKing):
+                    if attacks(piece, previous, blackKing, whiteKing):
+                        continue
+                    previousIndex = whiteKing << 12 | blackKing << 6 | previous
+                    if not white[previousIndex]:
+                        white[previousIndex] = ply + 2
+                        nextFrontier.append(previousIndex)
+            for index in seeds.pop(ply + 1, []):
+                if not white[index]:
+                    white[index] = ply + 2
+                    nextFrontier.append(index)
+        else:
+            # frontier: posizioni vinte dal bianco in ply semimosse. Il nero perde quando tutte le sue mosse ci portano.
+            for index in frontier:
+                whiteKing, blackKing, sq = index >> 12, index >> 6 & 63, index & 63
+                for previous in KING_STEPS[blackKing]:
+                    if previous == whiteKing or previous == sq or KING_MASKS[whiteKing] >> previous & 1:
+                        continue
+                    previousIndex = whiteKing << 12 | previous << 6 | sq
+                    if counts[previousIndex]:
+                        counts[previousIndex] -= 1
+                        if not counts[previousIndex]:
+                            black[previousIndex] = ply + 2
+                            nextFrontier.append(previousIndex)
+        frontier = nextFrontier
+        ply += 1
+    if ply > 254:
+        raise ValueError('DTM troppo grande per un byte')
+    return white, black
+
+
+'''
+Genera le tabelle di materials (nell'ordine di MATERIALS) e le scrive nella cartella directory
+'''
+def generateTables(directory=TABLEBASE_DIR, materials=MATERIALS):
+    os.makedirs(directory, exist_ok=True)
+    blackTables = {}
+    for piece in MATERIALS:
+        if piece not in materials:
+            continue
+        start = timeit.default_timer()
+        promotionTables = []
+        if piece == 'p':
+            for promotion in PROMOTIONS:
+                if promotion not in blackTables:  # La tabella della promozione può venire da una generazione precedente
+                    with open(os.path.join(directory, MATERIALS[promotion] + '.bin'), 'rb') as file:
+                        blackTables[promotion] = file.read()[TABLE_SIZE:]
+                promotionTables.append(blackTables[promotion])
+        white, black = generateTable(piece, promotionTables)
+        blackTables[piece] = black
+        with open(os.path.join(directory, MATERIALS[piece] + '.bin'), 'wb') as file:
+            file.write(white)
+            file.write(black)
+        print('%s: %d wins, longest mate %d plies, %.1fs' % (
+            MATERIALS[piece], sum(1 for value in white if value) + sum(1 for value in black if value),
+            max(max(white), max(black)) - 1, timeit.default_timer() - start))
+
+
+class Tablebases():
+    '''
+    Tabelle disponibili nella cartella directory, mappate in memoria in sola lettura
+    '''
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.files = []
+        self.tables = {}
+        for piece, material in MATERIALS.items():
+            path = os.path.join(directory, material + '.bin')
+            if os.path.isfile(path) and os.path.getsize(path) == 2 * TABLE_SIZE:
+                file = open(path, 'rb')
+                self.files.append(file)
+                self.tables[piece] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for file in self.files:
+            file.close()
+
+    '''
+    Esito della posizione di gs: (1 vince il bianco, 0 patta, -1 vince il nero; semimosse al matto),
+    oppure None se la posizione non è coperta dalle tabelle
+    '''
+    def probe(self, gs):
+        whiteSquares, blackSquares = gs.pieceSquares['w'], gs.pieceSquares['b']
+        if len(whiteSquares) + len(blackSquares) == 2:  # Re contro re
+            return 0, 0
+        if len(whiteSquares) + len(blackSquares) != 3:
+            return None
+        # Se il pezzo in più è del nero la posizione viene specchiata (riga r -> 7 - r) e i colori scambiati
+        if len(whiteSquares) == 2:
+            strongSquares, weakSquares, flip = whiteSquares, blackSquares, 0
+        else:
+            strongSquares, weakSquares, flip = blackSquares, whiteSquares, 56
+        for sq in strongSquares:
+            piece = gs.board[sq >> 3][sq & 7][1]
+            if piece == 'K':
+                king = sq
+            else:
+                other, otherPiece = sq, piece
+        if otherPiece in 'BN':  # Materiale insufficiente per dare matto
+            return 0, 0
+        table = self.tables.get(otherPiece)
+        if table is None:
+            return None
+        index = (king ^ flip) << 12 | (next(iter(weakSquares)) ^ flip) << 6 | (other ^ flip)
+        value = table[index if gs.whiteToMove == (flip == 0) else TABLE_SIZE + index]
+        if value == 0:
+            return 0, 0
+        return (1 if flip == 0 else -1), value - 1
+
+
+'''
+FEN della posizione della tabella piece con i pezzi sulle case date (il giocatore più forte è il bianco)
+'''
+def tableFen(piece, whiteKing, blackKing, sq, whiteToMove):
+    gs = ChessEngine.GameState()
+    gs.board = [['--'] * 8 for _ in range(8)]
+    gs.board[whiteKing >> 3][whiteKing & 7] = 'wK'
+    gs.board[blackKing >> 3][blackKing & 7] = 'bK'
+    gs.board[sq >> 3][sq & 7] = 'w' + piece
+    gs.whiteToMove = whiteToMove
+    gs.castlingRights = 0
+    return gs.getFen()
+
+
+'''
+Controlla su samples posizioni a caso che l'esito di ogni posizione sia coerente con quello delle posizioni
+raggiungibili con le mosse legali di GameState. Ritorna il numero di posizioni incoerenti.
+'''
+def verifyTables(tablebases, samples, useBitboards=True):
+    errors = 0
+    rng = random.Random(20220318)
+    for piece in tablebases.tables:
+        checked = 0
+        while checked < samples:
+            whiteKing, blackKing, sq = rng.sample(range(64), 3)
+            if KING_MASKS[whiteKing] >> blackKing & 1 or (piece == 'p' and not 8 <= sq < 56):
+                continue
+            whiteToMove = rng.random() < .5
+            if attacks(piece, sq, blackKing, whiteKing) and whiteToMove:  # Il nero non può essere sotto scacco
+                continue
+            gs = ChessEngine.GameState(useBitboards)
+            gs.loadFen(tableFen(piece, whiteKing, blackKing, sq, whiteToMove))
+            turn = 1 if whiteToMove else -1
+            best = None
+            for move in gs.getValidMoves():
+                gs.makeMove(move)
+                result, dtm = tablebases.probe(gs)
+                gs.undoMove()
+                # Punteggio per chi muove: prima le vittorie più rapide, poi la patta, poi le sconfitte più lente
+                score = (turn * result, -dtm if turn * result > 0 else dtm)
+                best = score if best is None or score > best else best
+            if best is None:  # Scaccomatto o stallo
+                expected = (-1 if gs.inCheck() else 0) * turn, 0
+            else:
+                expected = best[0] * turn, abs(best[1]) + 1 if best[0] else 0
+            if tablebases.probe(gs) != expected:
+                print('%s: table %s, moves %s' % (gs.getFen(), tablebases.probe(gs), expected))
+                errors += 1
+            checked += 1
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tablebase dei finali con tre pezzi')
+    parser.add_argument('--directory', default=TABLEBASE_DIR, help='cartella delle tabelle')
+    parser.add_argument('--generate', nargs='*', metavar='MATERIAL',
+                        help='genera le tabelle indicate (KQK, KRK, KPK; tutte se non indicate)')
+    parser.add_argument('--verify', type=int, metavar='SAMPLES', help='verifica le tabelle su posizioni a caso')
+    parser.add_argument('--fen', help='stampa l\'esito di questa posizione')
+    args = parser.parse_args()
+
+    if args.generate is not None:
+        materials = [piece for piece, material in MATERIALS.items() if material in args.generate or not args.generate]
+        generateTables(args.directory, materials)
+    tablebases = Tablebases(args.directory)
+    if args.verify:
+        errors = verifyTables(tablebases, args.verify)
+        print('%d positions per table checked, %d errors' % (args.verify, errors))
+    if args.fen:
+        gs = ChessEngine.GameState()
+        gs.loadFen(args.fen)
+        print(tablebases.probe(gs))
+    tablebases.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Tabella delle trasposizioni per la ricerca di SmartMoveFinder.
+Memorizza, per ogni posizione già analizzata (identificata dal suo hash di Zobrist), profondità,
+punteggio, tipo di limite e mossa migliore. La memoria è allocata una volta sola in array di dimensione fissa.
+"""
+
+from array import array
+
+EXACT = 0  # Il punteggio è esatto
+LOWERBOUND = 1  # Il punteggio è un limite inferiore (c'è stata una potatura beta)
+UPPERBOUND = 2  # Il punteggio è un limite superiore (nessuna mossa ha superato alpha)
+
+ENTRY_BYTES = 24  # Chiave (8 byte) + punteggio (8 byte) + dati impacchettati (8 byte)
+
+# Dati impacchettati di una voce: mossa migliore (Move.moveID, 17 bit), tipo di limite (2 bit),
+# profondità (8 bit), età della ricerca (8 bit) e un bit che indica che la voce è occupata
+MOVE_MASK = (1 << 17) - 1
+BOUND_SHIFT = 17
+DEPTH_SHIFT = 19
+AGE_SHIFT = 27
+USED = 1 << 35
+
+
+class TranspositionTable():
+    '''
+    sizeMB è il budget di memoria: il numero di voci è fissato alla creazione e non cresce mai.
+    Ogni bucket ha due voci: la prima viene sostituita solo da ricerche più profonde (o da una ricerca
+    più recente), la seconda viene sempre sovrascritta.
+    '''
+    def __init__(self, sizeMB=16):
+        self.buckets = max(1, sizeMB * 1024 * 1024 // (2 * ENTRY_BYTES))
+        self.keys = array('Q', bytes(8 * 2 * self.buckets))
+        self.scores = array('d', bytes(8 * 2 * self.buckets))
+        self.data = array('Q', bytes(8 * 2 * self.buckets))
+        self.age = 0
+
+    '''
+    Svuota la tabella (ad esempio quando inizia una nuova partita)
+    '''
+    def clear(self):
+        self.keys = array('Q', bytes(8 * 2 * self.buckets))
+        self.scores = array('d', bytes(8 * 2 * self.buckets))
+        self.data = array('Q', bytes(8 * 2 * self.buckets))
+        self.age = 0
+
+    '''
+    Da chiamare all'inizio di ogni ricerca: le voci delle ricerche precedenti restano utilizzabili,
+    ma possono essere sostituite anche da ricerche meno profonde
+    '''
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xFF
+
+    '''
+    Ritorna (profondità, punteggio, tipo di limite, moveID della mossa migliore) oppure None
+    '''
+    def probe(self, key):
+        index = (key % self.buckets) * 2
+        for i in (index, index + 1):
+            data = self.data[i]
+            if data & USED and self.keys[i] == key:
+                return (data >> DEPTH_SHIFT) & 0xFF, self.scores[i], (data >> BOUND_SHIFT) & 3, data & MOVE_MASK
+        return None
+
+    def store(self, key, depth, score, bound, moveID=0):
+        index = (key % self.buckets) * 2
+        data = self.data[index]
+        # Voce a profondità preferita: sostituita se vuota, se è la stessa posizione,
+        # se è di una ricerca precedente o se la nuova ricerca è almeno altrettanto profonda
+        if not data & USED or self.keys[index] == key or (data >> AGE_SHIFT) & 0xFF != self.age \
+                or depth >= (data >> DEPTH_SHIFT) & 0xFF:
+            if self.keys[index] != key and data & USED:  # La voce scalzata finisce nello slot sempre sostituibile
+                self.keys[index + 1] = self.keys[index]
+                self.scores[index + 1] = self.scores[index]
+                self.data[index + 1] = data
+        else:
+            index += 1
+        if moveID == 0 and self.keys[index] == key and self.data[index] & USED:
+            moveID = self.data[index] & MOVE_MASK  # Conserva la mossa migliore già nota
+        self.keys[index] = key
+        self.scores[index] = score
+        self.data[index] = USED | self.age << AGE_SHIFT | min(depth, 0xFF) << DEPTH_SHIFT \
+            | bound << BOUND_SHIFT | (moveID & MOVE_MASK)
@@ -0,0 +1,193 @@
+"""
+Interfaccia UCI per SmartMoveFinder, così il motore può essere usato da qualsiasi programma che parla UCI
+(interfacce grafiche, python-chess, la generazione dei dataset di SmartChess). Uso (dalla radice del repository):
+    python -m Chess.UciEngine
+Comandi supportati: uci, isready, ucinewgame, position [startpos | fen <FEN>] [moves ...],
+go [depth N] [movetime MS] [nodes N] [wtime MS btime MS winc MS binc MS] [infinite], stop, quit.
+"""
+
+import contextlib
+import io
+import os
+import queue
+import sys
+import threading
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Il messaggio di pygame non deve finire nel protocollo
+from Chess import ChessEngine, SmartMoveFinder
+from Chess.ScoreTables import CHECKMATE, MATE_PLIES
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+MAX_DEPTH = 64  # Profondità per "go infinite" (la ricerca finisce con stop)
+MOVES_TO_GO = 30  # Con il tempo di gioco si usa al più 1/MOVES_TO_GO del tempo rimasto (più l'incremento)
+
+
+'''
+Mossa in notazione UCI (e2e4, e7e8q)
+'''
+def uciMove(move):
+    return move.getChessNotation() + (move.promotionPiece[1].lower() if move.isPawnPromotion else '')
+
+
+'''
+Mossa legale di gs scritta in notazione UCI, oppure None
+'''
+def parseUciMove(gs, text):
+    startRow, startCol = ChessEngine.Move.ranksToRows[text[1]], ChessEngine.Move.filesToCols[text[0]]
+    endRow, endCol = ChessEngine.Move.ranksToRows[text[3]], ChessEngine.Move.filesToCols[text[2]]
+    for move in gs.getValidMovesFrom(startRow, startCol):
+        if move.endRow == endRow and move.endCol == endCol \
+                and (move.promotionPiece[1].lower() if move.isPawnPromotion else '') == text[4:]:
+            return move
+    return None
+
+
+'''
+Punteggio UCI (dal punto di vista di chi muove): "cp N" in centesimi di pedone oppure "mate N" in mosse.
+Un matto a ply semimosse dalla radice vale CHECKMATE - ply, sia nella ricerca sia nelle tablebase.
+'''
+def uciScore(score):
+    if abs(score) >= CHECKMATE - MATE_PLIES:
+        plies = CHECKMATE - abs(score)
+        return 'mate %d' % max(1, (plies + 1) // 2) if score > 0 else 'mate -%d' % max(1, plies // 2)
+    return 'cp %d' % round(score * 100)
+
+
+class UciEngine():
+    '''
+    Stato del motore: la posizione corrente e la ricerca in corso (eseguita in un thread, così "stop" viene letto)
+    '''
+    def __init__(self, output=sys.stdout, useBitboards=True):
+        self.output = output
+        self.gs = ChessEngine.GameState(useBitboards)
+        self.useBitboards = useBitboards
+        self.searchThread = None
+        self.stopped = threading.Event()
+        SmartMoveFinder.stopSearch = self.stopped.is_set
+
+    def send(self, line):
+        self.output.write(line + '\n')
+        self.output.flush()
+
+    '''
+    Esegue un comando; ritorna False con "quit"
+    '''
+    def command(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        name = tokens[0]
+        if name == 'uci':
+            self.send('id name SmartMoveFinder')
+            self.send('id author Shadypio')
+            self.send('uciok')
+        elif name == 'isready':
+            self.send('readyok')
+        elif name == 'ucinewgame':
+            self.waitSearch()
+            SmartMoveFinder.clearTranspositionTable()
+        elif name == 'position':
+            self.waitSearch()
+            self.setPosition(tokens[1:])
+        elif name == 'go':
+            self.waitSearch()
+            self.go(tokens[1:])
+        elif name == 'stop':
+            self.stopped.set()
+            self.waitSearch()
+        elif name == 'quit':
+            self.stopped.set()
+            self.waitSearch()
+            return False
+        return True
+
+    def setPosition(self, tokens):
+        if tokens and tokens[0] == 'fen':
+            fen = ' '.join(tokens[1:tokens.index('moves')] if 'moves' in tokens else tokens[1:])
+        else:
+            fen = START_FEN
+        self.gs = ChessEngine.GameState(self.useBitboards)
+        self.gs.loadFen(fen)
+        if 'moves' in tokens:
+            for text in tokens[tokens.index('moves') + 1:]:
+                move = parseUciMove(self.gs, text)
+                if move is None:
+                    break
+                self.gs.makeMove(move)
+
+    def go(self, tokens):
+        options = {name: int(value) for name, value in zip(tokens, tokens[1:])
+                   if name in ('depth', 'movetime', 'nodes', 'wtime', 'btime', 'winc', 'binc')}
+        maxDepth = options.get('depth', MAX_DEPTH if 'infinite' in tokens else SmartMoveFinder.DEPTH)
+        timeLimit = None
+        if 'movetime' in options:
+            timeLimit = options['movetime'] / 1000
+        elif 'wtime' in options or 'btime' in options:
+            remaining = options.get('wtime' if self.gs.whiteToMove else 'btime', 0)
+            increment = options.get('winc' if self.gs.whiteToMove else 'binc', 0)
+            timeLimit = (remaining / MOVES_TO_GO + increment) / 1000
+        elif 'depth' not in options and 'nodes' not in options and 'infinite' not in tokens:
+            timeLimit = SmartMoveFinder.TIME_LIMIT
+        self.stopped.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(maxDepth, timeLimit, options.get('nodes')))
+        self.searchThread.start()
+
+    def waitSearch(self):
+        if self.searchThread is not None:
+            self.searchThread.join()
+            self.searchThread = None
+
+    '''
+    Cerca la mossa migliore e la comunica con info (profondità, punteggio, nodi, variante principale) e bestmove
+    '''
+    def search(self, maxDepth, timeLimit, nodeLimit):
+        gs = self.gs
+        validMoves = gs.getValidMoves()
+        if not validMoves:  # Partita finita: nessuna mossa da giocare
+            self.send('info depth 0 score %s' % ('mate 0' if gs.checkMate else 'cp 0'))
+            self.send('bestmove 0000')
+            return
+        returnQueue = queue.Queue()
+        with contextlib.redirect_stdout(io.StringIO()):  # La ricerca stampa le proprie statistiche
+            SmartMoveFinder.findBestMove(gs, validMoves, returnQueue, maxDepth=maxDepth, timeLimit=timeLimit,
+                                         nodeLimit=nodeLimit, book=None)
+        move = returnQueue.get()
+        if move is None:  # Fermata prima della fine della prima iterazione
+            move = validMoves[0]
+        iterations = SmartMoveFinder.searchInfo['iterations']
+        if iterations:
+            last = iterations[-1]
+            pv = ' '.join(self.pvMoves(SmartMoveFinder.principalVariation))
+            self.send('info depth %d score %s nodes %d pv %s' % (last['depth'], uciScore(last['score']),
+                                                                 last['nodes'], pv or uciMove(move)))
+        elif SmartMoveFinder.tablebases is not None:  # Mossa presa dalle tablebase
+            score = SmartMoveFinder.tablebaseScore(gs)
+            if score is not None:
+                self.send('info depth 1 score %s pv %s' % (uciScore(score if gs.whiteToMove else -score),
+                                                         uciMove(move)))
+        self.send('bestmove ' + uciMove(move))
+
+    '''
+    Mosse della variante principale (moveID) in notazione UCI
+    '''
+    def pvMoves(self, moveIDs):
+        moves = []
+        for moveID in moveIDs:
+            move = SmartMoveFinder.findValidMove(self.gs, moveID)
+            if move is None:
+                break
+            self.gs.makeMove(move)
+            moves.append(move)
+        for _ in moves:
+            self.gs.undoMove()
+        return [uciMove(move) for move in moves]
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.command(line):
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import atexit
+import json
+import os
+import random
+import shlex
+import timeit
+from multiprocessing import Pool
+
+import chess
+import chess.engine
+import numpy
+from numpy.lib.format import open_memmap
+
+from BoardEncoding import PLANES, split_dims_batch
+
+'''
+Parallel generation of the training set.
+A pool of worker processes samples random positions (like random_board) and labels them with a UCI engine:
+every worker starts its engine once and keeps it for all its positions, instead of one popen_uci per position.
+Positions are produced in chunks; chunk i always contains the same positions (its random generator is seeded
+with the seed and i), and chunks are written in order into sharded .npy files opened as memmaps:
+b_00000.npy (N x 14 x 8 x 8 int8, encoded with split_dims_fast) and v_00000.npy (N int32, centipawns for white).
+manifest.json records how many positions every shard holds: it is rewritten after every chunk, so an
+interrupted run restarts from the first missing chunk. Run from the SmartChess folder:
+    python DatasetGeneration.py --output dataset --positions 1000000 --workers 8
+    python DatasetGeneration.py --output dataset --positions 2000 --depth 2 --engine "python -m Chess.UciEngine" --engine-cwd ..
+'''
+
+ENGINE = 'C:/Users/Enzuc/Documents/ChessEngine/stockfish_15_x64_avx2.exe'
+DEPTH = 10
+MAX_DEPTH = 200  # plies of the random games that produce the positions
+CHUNK_SIZE = 256  # positions per task of a worker
+SHARD_SIZE = 100000  # positions per shard
+MATE_SCORE = 10000  # centipawns given to a mate (python-chess score(mate_score=...))
+MANIFEST = 'manifest.json'
+ENCODER = 'split_dims_fast'
+
+# engine of the worker process, started by init_worker
+engine = None
+
+
+def init_worker(command, cwd):
+    global engine
+    engine = chess.engine.SimpleEngine.popen_uci(command, cwd=cwd)
+    # closed when the worker's interpreter exits; a pool worker leaves with os._exit, which skips atexit,
+    # and then the engine stops at the end of its stdin
+    atexit.register(engine.quit)
+
+
+# same as random_board, with the moves drawn from rng
+def sample_board(rng, max_depth=MAX_DEPTH):
+    board = chess.Board()
+    depth = rng.randrange(0, max_depth)
+
+    for _ in range(depth):
+        all_moves = list(board.legal_moves)
+        random_move = rng.choice(all_moves)
+        board.push(random_move)
+        if board.is_game_over():
+            break
+
+    return board
+
+
+# task of a worker: samples and labels the positions of one chunk
+def label_chunk(task):
+    chunk, seed, chunk_size, depth, mate_score = task
+    rng = random.Random(seed * 1000003 + chunk)
+    boards = []
+    scores = numpy.empty(chunk_size, dtype=numpy.int32)
+    for i in range(chunk_size):
+        board = sample_board(rng)
+        result = engine.analyse(board, chess.engine.Limit(depth=depth))
+        scores[i] = result['score'].white().score(mate_score=mate_score)
+        boards.append(board)
+    return chunk, split_dims_batch(boards), scores
+
+
+def load_manifest(output):
+    path = os.path.join(output, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+# the manifest is replaced atomically: an interruption leaves either the old or the new one
+def save_manifest(output, manifest):
+    path = os.path.join(output, MANIFEST)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+'''
+Appends positions to the shards of a dataset, opening a new shard when the last one is full.
+'''
+class ShardWriter():
+    def __init__(self, output, manifest, shard_size=SHARD_SIZE):
+        self.output = output
+        self.manifest = manifest
+        self.shard_size = shard_size
+        self.b = self.v = None
+        shards = manifest['shards']
+        # rows past the recorded count belong to a chunk that was not completed: they are overwritten
+        if shards and shards[-1]['count'] < shards[-1]['capacity']:
+            self.open_shard(shards[-1], 'r+')
+
+    def open_shard(self, shard, mode):
+        self.shard = shard
+        self.b = open_memmap(os.path.join(self.output, shard['b']), mode=mode, dtype=numpy.int8,
+                             shape=(shard['capacity'], PLANES, 8, 8))
+        self.v = open_memmap(os.path.join(self.output, shard['v']), mode=mode, dtype=numpy.int32,
+                             shape=(shard['capacity'],))
+
+    def new_shard(self):
+        index = len(self.manifest['shards'])
+        shard = {'b': 'b_%05d.npy' % index, 'v': 'v_%05d.npy' % index, 'count': 0, 'capacity': self.shard_size}
+        self.manifest['shards'].append(shard)
+        self.open_shard(shard, 'w+')
+
+    def write(self, b, v):
+        written = 0
+        while written < len(b):
+            if self.b is None or self.shard['count'] == self.shard['capacity']:
+                self.new_shard()
+            start = self.shard['count']
+            rows = min(len(b) - written, self.shard['capacity'] - start)
+            self.b[start:start + rows] = b[written:written + rows]
+            self.v[start:start + rows] = v[written:written + rows]
+            self.shard['count'] += rows
+            written += rows
+        # the data must be on disk before the manifest counts it
+        self.b.flush()
+        self.v.flush()
+        self.manifest['positions'] += len(b)
+        self.manifest['max_abs_score'] = max(self.manifest['max_abs_score'], int(numpy.abs(v).max()))
+        save_manifest(self.output, self.manifest)
+
+    # closes the memmaps and shrinks the last shard to the positions it holds
+    def close(self):
+        self.b = self.v = None
+        shards = self.manifest['shards']
+        if shards and shards[-1]['count'] < shards[-1]['capacity']:
+            shard = shards[-1]
+            for name in ('b', 'v'):
+                path = os.path.join(self.output, shard[name])
+                data = numpy.load(path, mmap_mode='r')[:shard['count']]
+                numpy.save(path + '.tmp.npy', data)
+                del data
+                os.replace(path + '.tmp.npy', path)
+            shard['capacity'] = shard['count']
+            save_manifest(self.output, self.manifest)
+
+
+'''
+Generates (or completes, if output already holds part of it) a dataset of at least positions positions
+'''
+def generate(output, positions, workers=None, command=ENGINE, cwd=None, depth=DEPTH, seed=0,
+             chunk_size=CHUNK_SIZE, shard_size=SHARD_SIZE, mate_score=MATE_SCORE):
+    os.makedirs(output, exist_ok=True)
+    manifest = load_manifest(output)
+    if manifest is None:
+        manifest = {'encoder': ENCODER, 'seed': seed, 'chunk_size': chunk_size, 'depth': depth,
+                    'engine': command, 'mate_score': mate_score, 'positions': 0, 'max_abs_score': 0, 'shards': []}
+    elif manifest['seed'] != seed or manifest['chunk_size'] != chunk_size:
+        raise ValueError('%s was generated with seed %d and chunk size %d' % (
+            output, manifest['seed'], manifest['chunk_size']))
+
+    first_chunk = manifest['positions'] // chunk_size
+    chunks = -(-positions // chunk_size)
+    tasks = [(chunk, seed, chunk_size, depth, mate_score) for chunk in range(first_chunk, chunks)]
+    if not tasks:
+        return manifest
+
+    writer = ShardWriter(output, manifest, shard_size)
+    pool = Pool(workers, init_worker, (shlex.split(command), cwd))
+    start = timeit.default_timer()
+    try:
+        # imap keeps the chunks in order, so the positions on disk are always chunks 0 .. k
+        for chunk, b, v in pool.imap(label_chunk, tasks):
+            writer.write(b, v)
+            elapsed = timeit.default_timer() - start
+            done = (chunk - first_chunk + 1) * chunk_size
+            print('%d/%d positions, %.0f positions/s' % (manifest['positions'], chunks * chunk_size, done / elapsed))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel generation of the SmartChess training set')
+    parser.add_argument('--output', default='dataset', help='folder of the shards and of the manifest')
+    parser.add_argument('--positions', type=int, required=True, help='positions the dataset must hold')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--engine', default=ENGINE, help='command that starts the UCI engine')
+    parser.add_argument('--engine-cwd', help='working directory of the engine')
+    parser.add_argument('--depth', type=int, default=DEPTH, help='search depth of the labels')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random positions')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='positions per worker task')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='positions per shard')
+    args = parser.parse_args()
+
+    generate(args.output, args.positions, args.workers, args.engine, args.engine_cwd, args.depth, args.seed,
+             args.chunk_size, args.shard_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import glob
+import json
+import os
+import queue
+import threading
+
+import numpy
+
+'''
+Training on datasets larger than the memory.
+The shards written by DatasetGeneration (b_XXXXX.npy and v_XXXXX.npy, uncompressed) are opened as memmaps,
+so only the rows of the current minibatch are read from disk. The scores are normalised batch by batch with
+the same formula as get_dataset (v / abs(v).max() / 2 + 0.5), using the largest absolute score of the whole
+dataset recorded in manifest.json. Example:
+    dataset = ShardedDataset('dataset')
+    train, validation = dataset.split(0.1)
+    model.fit(tf_dataset(dataset, 2048, train), validation_data=tf_dataset(dataset, 2048, validation, shuffle=False),
+              epochs=1000, callbacks=[...])
+'''
+
+BATCH_SIZE = 2048
+PREFETCH = 4  # batches prepared in advance by the background thread
+
+
+class ShardedDataset():
+    def __init__(self, path):
+        manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+            shards = [(shard['b'], shard['v'], shard['count']) for shard in manifest['shards']]
+            self.scale = manifest['max_abs_score']
+        else:
+            # shards without a manifest: every row of every file is used
+            shards = [(os.path.basename(b), 'v' + os.path.basename(b)[1:], None)
+                      for b in sorted(glob.glob(os.path.join(path, 'b_*.npy')))]
+            self.scale = None
+        self.b = []
+        self.v = []
+        for b, v, count in shards:
+            self.b.append(numpy.load(os.path.join(path, b), mmap_mode='r')[:count])
+            self.v.append(numpy.load(os.path.join(path, v), mmap_mode='r')[:count])
+        if self.scale is None:
+            # one pass over the scores only, one shard at a time
+            self.scale = max((int(numpy.abs(v).max()) for v in self.v if len(v)), default=1)
+        # first global index of every shard
+        self.offsets = numpy.cumsum([0] + [len(v) for v in self.v])
+        self.rng = numpy.random.default_rng()
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    # scores to the 0 - 1 range of the sigmoid output of the model
+    def normalize(self, v):
+        return numpy.asarray(v / self.scale / 2 + 0.5, dtype=numpy.float32)
+
+    # boards and normalised scores of the positions with the given global indices
+    def read(self, indices):
+        indices = numpy.sort(indices)  # rows in file order: fewer and more sequential reads
+        shard_of = numpy.searchsorted(self.offsets, indices, side='right') - 1
+        b = numpy.empty((len(indices),) + self.b[0].shape[1:], dtype=self.b[0].dtype)
+        v = numpy.empty(len(indices), dtype=self.v[0].dtype)
+        for shard in numpy.unique(shard_of):
+            rows = shard_of == shard
+            local = indices[rows] - self.offsets[shard]
+            b[rows] = self.b[shard][local]
+            v[rows] = self.v[shard][local]
+        return b, self.normalize(v)
+
+    # random split of the positions into training and validation indices (like validation_split)
+    def split(self, validation_split=0.1, seed=0):
+        indices = numpy.random.default_rng(seed).permutation(len(self))
+        validation = int(len(indices) * validation_split)
+        return indices[validation:], indices[:validation]
+
+    '''
+    One epoch of minibatches (b, v) over indices (all the positions if None).
+    Every call draws a new order, unless a seed is given.
+    '''
+    def batches(self, batch_size=BATCH_SIZE, indices=None, shuffle=True, seed=None, drop_remainder=False):
+        if indices is None:
+            indices = numpy.arange(len(self))
+        if shuffle:
+            rng = numpy.random.default_rng(seed) if seed is not None else self.rng
+            indices = rng.permutation(indices)
+        end = len(indices) - len(indices) % batch_size if drop_remainder else len(indices)
+        for start in range(0, end, batch_size):
+            yield self.read(indices[start:start + batch_size])
+
+
+# iterates over iterable while a background thread prepares the next size items
+def prefetch(iterable, size=PREFETCH):
+    items = queue.Queue(maxsize=size)
+    done = object()
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+        except BaseException as error:  # raised again in the consumer
+            items.put((done, error))
+            return
+        items.put((done, None))
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is done:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():  # unblocks the producer if it is waiting on a full queue
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+'''
+tf.data source of the minibatches of dataset, for model.fit. Every epoch reshuffles the positions.
+'''
+def tf_dataset(dataset, batch_size=BATCH_SIZE, indices=None, shuffle=True, prefetch_size=PREFETCH):
+    import tensorflow as tf
+
+    def generator():
+        batches = dataset.batches(batch_size, indices, shuffle)
+        return prefetch(batches, prefetch_size) if prefetch_size else batches
+
+    return tf.data.Dataset.from_generator(generator, output_signature=(
+        tf.TensorSpec(shape=(None,) + dataset.b[0].shape[1:], dtype=tf.as_dtype(dataset.b[0].dtype)),
+        tf.TensorSpec(shape=(None,), dtype=tf.float32)))
@@ -7,6 +7,7 @@ import tensorflow.keras.layers as layers
 import tensorflow.keras.utils as utils
 import tensorflow.keras.optimizers as optimizers
 import tensorflow.keras.callbacks as callbacks
+from BoardEncoding import BITBOARD_DTYPE, board_bitboards, split_dims_fast, unpack_bitboards
 
 
 
@@ -165,25 +166,57 @@ print("hello")'''
 Playing with the AI
 '''
 model = models.load_model('Models/myModel_23.h5')
+# the models in Models/ were trained on split_dims: the fast encoder (attack masks instead of
+# legal moves in the last two planes) is only for models trained on split_dims_fast
+FAST_ENCODER = False
 
 
 # used for the minimax algorithm
 def minimax_eval(board):
-    board3d = split_dims(board)
+    board3d = split_dims_fast(board) if FAST_ENCODER else split_dims(board)
     board3d = numpy.expand_dims(board3d, 0)
     return model(board3d)[0][0]
 
 
+# evaluates every position reachable from board with one of the moves
+# with a single call to the model (one batch instead of one call per leaf)
+def minimax_eval_children(board, moves):
+    boards3d = numpy.empty((len(moves), 14, 8, 8), dtype=numpy.int8)
+    if FAST_ENCODER:
+        bitboards = []
+        for move in moves:
+            board.push(move)
+            bitboards.append(board_bitboards(board))
+            board.pop()
+        unpack_bitboards(numpy.array(bitboards, dtype=BITBOARD_DTYPE), boards3d)
+    else:
+        for i, move in enumerate(moves):
+            board.push(move)
+            boards3d[i] = split_dims(board)
+            board.pop()
+    return model(boards3d)[:, 0].numpy()
+
+
+'''
+The last ply is expanded fully: at depth 1 all the children are evaluated together by minimax_eval_children,
+then visited in the same order and with the same alpha-beta cutoffs as before, so the search returns the
+same values as evaluating every leaf on its own.
+'''
 def minimax(board, depth, alpha, beta, maximizing_player):
     if depth == 0 or board.is_game_over():
         return minimax_eval(board)
 
+    moves = list(board.legal_moves)
+    leaf_evals = minimax_eval_children(board, moves) if depth == 1 else None
     if maximizing_player:
         max_eval = -numpy.inf
-        for move in board.legal_moves:
-            board.push(move)
-            eval = minimax(board, depth - 1, alpha, beta, False)
-            board.pop()
+        for i, move in enumerate(moves):
+            if leaf_evals is not None:
+                eval = leaf_evals[i]
+            else:
+                board.push(move)
+                eval = minimax(board, depth - 1, alpha, beta, False)
+                board.pop()
             max_eval = max(max_eval, eval)
             alpha = max(alpha, eval)
             if beta <= alpha:
@@ -191,10 +224,13 @@ def minimax(board, depth, alpha, beta, maximizing_player):
         return max_eval
     else:
         min_eval = numpy.inf
-        for move in board.legal_moves:
-            board.push(move)
-            eval = minimax(board, depth - 1, alpha, beta, True)
-            board.pop()
+        for i, move in enumerate(moves):
+            if leaf_evals is not None:
+                eval = leaf_evals[i]
+            else:
+                board.push(move)
+                eval = minimax(board, depth - 1, alpha, beta, True)
+                board.pop()
             min_eval = min(min_eval, eval)
             beta = min(beta, eval)
             if beta <= alpha:
@@ -207,10 +243,16 @@ def get_ai_move(board, depth):
     max_move = None
     max_eval = -numpy.inf
 
-    for move in board.legal_moves:
-        board.push(move)
-        eval = minimax(board, depth - 1, -numpy.inf, numpy.inf, False)
-        board.pop()
+    moves = list(board.legal_moves)
+    # with depth 1 the root is the parent of the leaves: one batch for all the moves
+    leaf_evals = minimax_eval_children(board, moves) if depth == 1 else None
+    for i, move in enumerate(moves):
+        if leaf_evals is not None:
+            eval = leaf_evals[i]
+        else:
+            board.push(move)
+            eval = minimax(board, depth - 1, -numpy.inf, numpy.inf, False)
+            board.pop()
         if eval > max_eval:
             max_eval = eval
             max_move = move
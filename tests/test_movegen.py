@@ -0,0 +1,72 @@
+"""
+Test della generazione delle mosse di entrambi i GameState (a matrice e a bitboard): perft a bassa profondità
+sulle posizioni di riferimento, stato incrementale dopo makeMove/undoMove e generazione a fasi della ricerca.
+Uso (dalla radice del repository):
+    python -m pytest tests
+"""
+
+import random
+import pytest
+from Chess import ChessEngine, Perft
+
+PERFT_DEPTH = 2  # Profondità usata per tutte le posizioni della suite
+PLIES = 30  # Semimosse di ogni partita casuale
+SEED = 2024
+
+GAME_STATES = pytest.mark.parametrize('useBitboards', [False, True], ids=['mailbox', 'bitboards'])
+POSITIONS = pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, _, _ in Perft.POSITIONS],
+                                    ids=[name for name, _, _, _ in Perft.POSITIONS])
+
+
+'''
+Posizioni raggiunte da una partita casuale (riproducibile) a partire da fen: per ognuna ritorna gs già aggiornato
+'''
+def randomGame(useBitboards, fen, plies=PLIES):
+    rng = random.Random(SEED)
+    gs = ChessEngine.GameState(useBitboards)
+    gs.loadFen(fen)
+    for _ in range(plies):
+        yield gs
+        moves = gs.getValidMoves()
+        if not moves:
+            return
+        gs.makeMove(rng.choice(moves))
+
+
+def moveKeys(moves):
+    return sorted(move.moveID for move in moves)
+
+
+@GAME_STATES
+def testPerftSuite(useBitboards):
+    for entry in Perft.runSuite(useBitboards, PERFT_DEPTH):
+        assert entry['nodes'] == entry['expected'], entry['name']
+
+
+@GAME_STATES
+@POSITIONS
+def testMakeUndoRoundTrip(useBitboards, name, fen):
+    for gs in randomGame(useBitboards, fen):
+        fenBefore, hashBefore = gs.getFen(), gs.zobristHash
+        scoresBefore = (gs.materialScore, gs.positionScore)
+        movesBefore = moveKeys(gs.getValidMoves())
+        for move in gs.getValidMoves():
+            gs.makeMove(move)
+            assert gs.zobristHash == gs.computeZobristHash(), move.getChessNotation()
+            assert (gs.materialScore, gs.positionScore) == gs.computeScores(), move.getChessNotation()
+            gs.undoMove()
+            assert gs.getFen() == fenBefore
+            assert gs.zobristHash == hashBefore
+            assert (gs.materialScore, gs.positionScore) == scoresBefore
+        assert moveKeys(gs.getValidMoves()) == movesBefore
+
+
+@GAME_STATES
+@POSITIONS
+def testStagedGenerationMatchesFull(useBitboards, name, fen):
+    for gs in randomGame(useBitboards, fen):
+        pinsAndChecks = gs.checkForPinsAndChecks()
+        captures = gs.getValidCaptures(pinsAndChecks)
+        quietMoves = gs.getValidQuietMoves(pinsAndChecks)
+        assert not set(moveKeys(captures)) & set(moveKeys(quietMoves))
+        assert moveKeys(captures + quietMoves) == moveKeys(gs.getValidMoves())